@@ -0,0 +1,50 @@
+# Сравнение пакетного расчёта с построчным вызовом calculate_utility_cost.
+# Запуск: python benchmarks/bench_batch.py [N]
+import os
+import sys
+import random
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jkx_core import calculate_utility_cost
+from jkx_batch import calculate_utility_cost_batch
+
+
+def make_readings(n, seed=42):
+    rnd = random.Random(seed)
+    prev, curr = [], []
+    for _ in range(n):
+        p = [round(rnd.uniform(0, 500), 3), round(rnd.uniform(0, 800), 3), round(rnd.uniform(0, 20000), 1)]
+        prev.append(p)
+        curr.append([p[0] + round(rnd.uniform(0, 6), 3), p[1] + round(rnd.uniform(0, 9), 3),
+                     p[2] + round(rnd.uniform(0, 400), 1)])
+    return prev, curr
+
+
+def main(n):
+    prev, curr = make_readings(n)
+
+    t0 = time.perf_counter()
+    loop = [calculate_utility_cost(p, c) for p, c in zip(prev, curr)]
+    t_loop = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    totals, hot, cold, elec, breakdown = calculate_utility_cost_batch(prev, curr)
+    t_batch = time.perf_counter() - t0
+
+    # Результаты должны совпадать побитно
+    for i, (total, hu, cu, eu, bd) in enumerate(loop):
+        for key, value in bd.items():
+            batch_value = breakdown[key] if isinstance(breakdown[key], float) else breakdown[key][i]
+            assert float(batch_value) == value, (i, key, batch_value, value)
+        assert (float(totals[i]), float(hot[i]), float(cold[i]), float(elec[i])) == (total, hu, cu, eu), i
+
+    print(f"N={n}")
+    print(f"  цикл calculate_utility_cost: {t_loop:.4f} с ({n / t_loop:,.0f} кв./с)")
+    print(f"  calculate_utility_cost_batch: {t_batch:.4f} с ({n / t_batch:,.0f} кв./с)")
+    print(f"  ускорение: x{t_loop / t_batch:.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
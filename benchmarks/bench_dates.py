@@ -0,0 +1,35 @@
+# Микробенчмарк разбора дат: перебор strptime против DateParser с запомненным форматом.
+# Запуск: python benchmarks/bench_dates.py [N]
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jkx_history import DATE_FORMATS, DateParser, _strptime_any
+
+
+def make_dates(n, fmt):
+    start = datetime(2015, 1, 1)
+    return [(start + timedelta(minutes=37 * i)).strftime(fmt) for i in range(n)]
+
+
+def timed(fn, values):
+    t0 = time.perf_counter()
+    out = [fn(v) for v in values]
+    return time.perf_counter() - t0, out
+
+
+def main(n):
+    print(f"N={n:,} строк на формат")
+    for fmt in DATE_FORMATS:
+        values = make_dates(n, fmt)
+        t_old, old = timed(lambda s: _strptime_any(s)[0], values)
+        t_new, new = timed(DateParser(), values)
+        assert old == new, fmt
+        print(f"  {fmt:<20} strptime: {t_old:7.3f} с   DateParser: {t_new:7.3f} с   x{t_old / t_new:.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,29 @@
+# Время импорта: ядро/CLI против полного GUI-модуля (python -X importtime).
+# Запуск: python benchmarks/bench_import.py [повторов]
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ('jkx_core', 'jkx_cli', 'jkx_calculator')
+
+
+def import_time_us(module):
+    # Последняя строка -X importtime для модуля содержит его суммарное (cumulative) время
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    for line in reversed(proc.stderr.splitlines()):
+        parts = [p.strip() for p in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1])
+    raise RuntimeError(f"нет данных importtime для {module}")
+
+
+def main(repeat):
+    for module in MODULES:
+        best = min(import_time_us(module) for _ in range(repeat))
+        print(f"  {module:<15} {best / 1000:8.1f} мс")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,110 @@
+# Нагрузочный тест локального сервиса расчёта (jkx-calc serve) — запросов в секунду.
+# Сервис запускается отдельным процессом на временной истории; клиенты — asyncio-соединения
+# с keep-alive, каждое шлёт свои запросы последовательно.
+#
+#   python benchmarks/bench_service.py                 # 5000 запросов, 32 соединения
+#   python benchmarks/bench_service.py 20000 --connections 64
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def _request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        if key.lower() == 'content-length':
+            length = int(value)
+    data = await reader.readexactly(length)
+    if status != 200:
+        raise RuntimeError(f"{method} {path}: {status} {data.decode('utf-8')}")
+    return json.loads(data)
+
+
+async def _client(port, make_request, count, conn_id):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        for i in range(count):
+            await _request(reader, writer, *make_request(conn_id, i))
+    finally:
+        writer.close()
+
+
+async def run_scenario(port, make_request, total, connections):
+    per_conn = total // connections
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_client(port, make_request, per_conn, c) for c in range(connections)))
+    elapsed = time.perf_counter() - t0
+    return per_conn * connections, elapsed
+
+
+def _scenarios(batch_rows):
+    rnd = random.Random(5)
+    prev = [[rnd.uniform(0, 500), rnd.uniform(0, 800), rnd.uniform(0, 20000)] for _ in range(batch_rows)]
+    curr = [[p[0] + 1.5, p[1] + 2.0, p[2] + 80.0] for p in prev]
+    return [
+        ("last-reading", lambda c, i: ('GET', f"/last-reading?meter=m{c}")),
+        ("calculate", lambda c, i: ('POST', "/calculate",
+                                    {'prev': [100.0, 200.0, 3000.0], 'curr': [101.5 + i, 203.0, 3090.0]})),
+        ("calculate+save", lambda c, i: ('POST', "/calculate",
+                                         {'meter': f"m{c}", 'curr': [1.0 + i, 2.0 + i, 10.0 + i], 'save': True})),
+        (f"batch-calculate[{batch_rows}]", lambda c, i: ('POST', "/batch-calculate",
+                                                         {'prev': prev, 'curr': curr})),
+    ]
+
+
+def _start_server(workdir):
+    cmd = [sys.executable, os.path.join(ROOT, 'jkx_cli.py'),
+           '--history', os.path.join(workdir, 'utility_history.csv'),
+           '--history-dir', os.path.join(workdir, 'history'),
+           'serve', '--port', '0']
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True, cwd=ROOT)
+    line = proc.stdout.readline()
+    if not line:
+        raise RuntimeError("Сервис не запустился")
+    return proc, int(line.rsplit(':', 1)[1])
+
+
+async def main_async(args, port):
+    for name, make_request in _scenarios(args.batch_rows):
+        total = args.requests if not name.startswith('batch') else max(args.connections, args.requests // 20)
+        done, elapsed = await run_scenario(port, make_request, total, args.connections)
+        print(f"  {name:<24} {done:7d} запросов  {elapsed:7.3f} с  {done / elapsed:10,.0f} запр./с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест jkx-calc serve")
+    parser.add_argument('requests', nargs='?', type=int, default=5000, help="запросов на сценарий")
+    parser.add_argument('--connections', type=int, default=32, help="одновременных соединений")
+    parser.add_argument('--batch-rows', type=int, default=100, help="квартир в одном batch-calculate")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='jkx-service-')
+    proc, port = _start_server(workdir)
+    try:
+        print(f"Сервис на порту {port}, соединений: {args.connections}")
+        asyncio.run(main_async(args, port))
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+# Набор бенчмарков: разбор истории (CSV и .jkxc), последние показания, экспорт, расчёт (поштучно и пакетно),
+# построение графика без GUI (Agg). Результаты — в JSON, который можно сравнить с прошлым прогоном.
+#
+#   python benchmarks/suite.py --sizes 1000 100000 -o bench.json
+#   python benchmarks/suite.py --sizes 1000000 --compare bench.json
+#   python benchmarks/suite.py --profile cprofile --profile-dir prof/   # .prof на каждый этап
+#   python benchmarks/suite.py --profile tracemalloc                    # пик памяти на этап
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import cProfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import jkx_core
+from jkx_batch import calculate_utility_cost_batch
+from jkx_history import DATE_FORMATS, HEADER, HistoryStore
+from jkx_aggregate import aggregate_history
+from jkx_stats import HistoryStats
+from jkx_export import FORMATS, export_history
+from jkx_columnar import ColumnarHistory, csv_to_columnar
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+LAST_READING_CALLS = 1_000
+
+
+# --- Synthetic data ---
+def make_history(path, n, fmt, seed=7):
+    rnd = random.Random(seed)
+    d = datetime(2010, 1, 1)
+    curr = [0.0, 0.0, 0.0]
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        f.write(';'.join(HEADER) + '\r\n')
+        for _ in range(n):
+            d += timedelta(minutes=rnd.randint(1, 120))
+            usage = [round(rnd.uniform(0, 0.5), 3), round(rnd.uniform(0, 0.5), 3), round(rnd.uniform(0, 5), 2)]
+            curr = [c + u for c, u in zip(curr, usage)]
+            total = usage[0] * 211.44 + usage[1] * 69.1 + usage[2] * 4.95
+            f.write(f"{d.strftime(fmt)};{curr[0]};{curr[1]};{curr[2]};"
+                    f"{usage[0]};{usage[1]};{usage[2]};{total}\r\n")
+
+
+def make_readings(n, seed=11):
+    rnd = random.Random(seed)
+    prev = [[rnd.uniform(0, 500), rnd.uniform(0, 800), rnd.uniform(0, 20000)] for _ in range(n)]
+    curr = [[p[0] + rnd.uniform(0, 6), p[1] + rnd.uniform(0, 9), p[2] + rnd.uniform(0, 400)] for p in prev]
+    return prev, curr
+
+
+# --- Stages ---
+def stage_parse(path):
+    # холодный старт: без индекса, полный разбор CSV
+    if os.path.exists(path + '.idx'):
+        os.remove(path + '.idx')
+    store = HistoryStore(path)
+    store.query()
+    return len(store)
+
+
+def stage_columnar(path):
+    # та же выборка, что parse, но из .jkxc через mmap (файл сконвертирован заранее)
+    with ColumnarHistory(path) as hist:
+        cols = hist.query()
+        sum(cols[7])
+        n = len(cols[0])
+        del cols
+    return n
+
+
+def stage_stats(path):
+    # первый проход по всей истории; дальше каждая новая строка — O(1)
+    stats = HistoryStats(HistoryStore(path)).refresh()
+    return stats.rows
+
+
+def stage_export(path, fmt):
+    # потоковая выгрузка всей истории с пересчётом детализации; память не растёт с числом строк
+    jkx_core.HISTORY_FILE = path
+    out = path + '.' + fmt
+    try:
+        return export_history(out, fmt, recalc=True)
+    finally:
+        os.remove(out)
+
+
+def stage_last_reading(path):
+    store = HistoryStore(path)
+    for _ in range(LAST_READING_CALLS):
+        store.last_reading()
+    return LAST_READING_CALLS
+
+
+def stage_single_calc(prev, curr):
+    calc = jkx_core.calculate_utility_cost
+    for p, c in zip(prev, curr):
+        calc(p, c)
+    return len(prev)
+
+
+def stage_bulk_calc(prev, curr):
+    calculate_utility_cost_batch(prev, curr)
+    return len(prev)
+
+
+def stage_figure(path):
+    # то же, что вкладка «История» (вид «Общий»), но на Agg без Tk
+    jkx_core.HISTORY_FILE = path
+    agg = aggregate_history()
+    fig = Figure(dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    ax.plot(agg['dates'], agg['totals'], marker='o', label='Итого, ₽')
+    for xi, yi in zip(agg['dates'], agg['totals']):
+        ax.annotate(f"{yi:.0f}", (xi, yi), textcoords="offset points", xytext=(0, 5), ha='center', fontsize=9)
+    ax.legend()
+    fig.tight_layout()
+    fig.canvas.draw()
+    return len(agg['dates'])
+
+
+# --- Runner ---
+def run_stage(name, fn, args, profile, profile_dir):
+    result = {}
+    prof = None
+    if profile == 'tracemalloc':
+        tracemalloc.start()
+    elif profile == 'cprofile':
+        prof = cProfile.Profile()
+        prof.enable()
+    t0 = time.perf_counter()
+    items = fn(*args)
+    elapsed = time.perf_counter() - t0
+    if prof is not None:
+        prof.disable()
+        os.makedirs(profile_dir, exist_ok=True)
+        prof.dump_stats(os.path.join(profile_dir, f"{name}.prof"))
+    if profile == 'tracemalloc':
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    result.update({'seconds': elapsed, 'items': items,
+                   'items_per_sec': items / elapsed if elapsed else None})
+    return result
+
+
+def run_suite(sizes, formats, profile=None, profile_dir='profiles', workdir=None):
+    results = {}
+    tmp = workdir or tempfile.mkdtemp(prefix='jkx-bench-')
+    try:
+        for n in sizes:
+            for i, fmt in enumerate(formats):
+                path = os.path.join(tmp, f"history_{n}_{i}.csv")
+                make_history(path, n, fmt)
+                key = f"parse[{fmt}]/{n}"
+                results[key] = run_stage(f"parse{i}_{n}", stage_parse, (path,), profile, profile_dir)
+                print(_line(key, results[key]))
+                if i:
+                    os.remove(path)
+                    continue
+                for stage, fn in (('last_reading', stage_last_reading), ('figure', stage_figure),
+                                  ('stats', stage_stats)):
+                    key = f"{stage}/{n}"
+                    results[key] = run_stage(f"{stage}_{n}", fn, (path,), profile, profile_dir)
+                    print(_line(key, results[key]))
+                for fmt in FORMATS:
+                    key = f"export[{fmt}]/{n}"
+                    results[key] = run_stage(f"export_{fmt}_{n}", stage_export, (path, fmt), profile, profile_dir)
+                    print(_line(key, results[key]))
+                columnar = path[:-4] + '.jkxc'
+                csv_to_columnar(path, columnar)
+                key = f"columnar_load/{n}"
+                results[key] = run_stage(f"columnar_load_{n}", stage_columnar, (columnar,), profile, profile_dir)
+                print(_line(key, results[key]))
+                os.remove(columnar)
+                os.remove(path)
+
+            prev, curr = make_readings(n)
+            for stage, fn in (('single_calc', stage_single_calc), ('bulk_calc', stage_bulk_calc)):
+                key = f"{stage}/{n}"
+                results[key] = run_stage(f"{stage}_{n}", fn, (prev, curr), profile, profile_dir)
+                print(_line(key, results[key]))
+    finally:
+        if workdir is None:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+def _line(key, res):
+    line = f"  {key:<40} {res['seconds']:9.4f} с"
+    if res.get('items_per_sec'):
+        line += f"  {res['items_per_sec']:14,.0f} /с"
+    if 'peak_bytes' in res:
+        line += f"  пик {res['peak_bytes'] / 2**20:8.1f} МиБ"
+    return line
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    print(f"\nСравнение с {baseline_path} (время: было → стало):")
+    for key, res in results.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        ratio = res['seconds'] / old['seconds'] if old['seconds'] else float('inf')
+        print(f"  {key:<40} {old['seconds']:9.4f} → {res['seconds']:9.4f} с  x{ratio:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки jkx_calculator")
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(DEFAULT_SIZES),
+                        help="размеры синтетической истории (строк), до 10_000_000")
+    parser.add_argument('--formats', nargs='+', default=list(DATE_FORMATS), help="форматы дат в истории")
+    parser.add_argument('-o', '--output', default='bench_results.json', help="файл результатов (JSON)")
+    parser.add_argument('--compare', help="JSON прошлого прогона для сравнения")
+    parser.add_argument('--profile', choices=('cprofile', 'tracemalloc'), help="профилировать каждый этап")
+    parser.add_argument('--profile-dir', default='profiles', help="куда класть .prof для --profile cprofile")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.sizes, args.formats, args.profile, args.profile_dir)
+    payload = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'profile': args.profile,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты: {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
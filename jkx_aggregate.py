@@ -0,0 +1,64 @@
+from datetime import date
+from itertools import groupby
+
+import jkx_core
+
+# Свёртка истории для графиков: на длинных периодах точки суммируются по дням,
+# месяцам или годам, чтобы число точек (и подписей) на графике было ограничено.
+
+BUCKETS = ('day', 'month', 'year')
+BUCKET_TITLES = {None: "", 'day': "по дням", 'month': "по месяцам", 'year': "по годам"}
+MAX_POINTS = 120
+
+
+def _bucket_key(bucket):
+    if bucket == 'day':
+        return lambda d: d.date()
+    if bucket == 'month':
+        return lambda d: date(d.year, d.month, 1)
+    if bucket == 'year':
+        return lambda d: date(d.year, 1, 1)
+    raise ValueError(f"Неизвестный интервал свёртки: {bucket}")
+
+
+def rollup(dates, columns, bucket):
+    """Суммы колонок по интервалам bucket. dates отсортированы; возвращает (даты начала интервалов, колонки)."""
+    key = _bucket_key(bucket)
+    out_dates, out_cols = [], [[] for _ in columns]
+    rows = zip(dates, *columns)
+    for start, group in groupby(rows, key=lambda r: key(r[0])):
+        sums = [0.0] * len(columns)
+        for row in group:
+            for i, v in enumerate(row[1:]):
+                sums[i] += v
+        out_dates.append(start)
+        for col, v in zip(out_cols, sums):
+            col.append(v)
+    return out_dates, out_cols
+
+
+def choose_bucket(dates, max_points=MAX_POINTS):
+    """Самый мелкий интервал, при котором точек не больше max_points; None — свёртка не нужна."""
+    if len(dates) <= max_points:
+        return None
+    span_days = (dates[-1] - dates[0]).days + 1
+    if span_days <= max_points:
+        return 'day'
+    if (dates[-1].year - dates[0].year) * 12 + dates[-1].month - dates[0].month + 1 <= max_points:
+        return 'month'
+    return 'year'
+
+
+def aggregate_history(since=None, until=None, max_points=MAX_POINTS, meter=None):
+    """Расход и стоимость за период, свёрнутые под max_points точек.
+
+    Возвращает dict: dates (date), hot, cold, elec, totals и bucket (None — исходные записи).
+    """
+    dates, _, _, _, hot_u, cold_u, elec_u, totals = jkx_core.read_history(since, until, meter)
+    bucket = choose_bucket(dates, max_points)
+    if bucket is None:
+        labels, cols = [d.date() for d in dates], [hot_u, cold_u, elec_u, totals]
+    else:
+        labels, cols = rollup(dates, [hot_u, cold_u, elec_u, totals], bucket)
+    return {'dates': labels, 'hot': cols[0], 'cold': cols[1], 'elec': cols[2],
+            'totals': cols[3], 'bucket': bucket}
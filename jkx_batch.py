@@ -0,0 +1,156 @@
+from array import array
+
+from jkx_core import get_plan
+from jkx_tariffs import as_plan
+
+try:
+    import numpy as np
+except ImportError:  # numpy необязателен — без него считаем по колонкам в чистом Python
+    np = None
+
+
+# --- Batch calculation (векторный аналог calculate_utility_cost) ---
+# prev/curr — показания N счётчиков формы (N, 3): [горячая, холодная, электричество].
+# Порядок операций повторяет скалярную функцию один в один, поэтому результат
+# совпадает с calculate_utility_cost до последнего бита.
+def calculate_utility_cost_batch(prev, curr, coeff=None):
+    # Ставки разбираются один раз на весь пакет (TariffPlan), а не на каждую квартиру
+    plan = get_plan() if coeff is None else as_plan(coeff)
+    if np is not None:
+        return _batch_numpy(prev, curr, plan)
+    return _batch_python(prev, curr, plan)
+
+
+def _decreasing_error(rows):
+    shown = ", ".join(str(i) for i in rows[:10])
+    if len(rows) > 10:
+        shown += ", ..."
+    return ValueError(f"Показания не могут быть меньше предыдущих! (строки: {shown})")
+
+
+_SHAPE_ERROR = "Показания должны быть таблицей формы (N, 3): [горячая, холодная, электричество] на счётчик."
+
+
+def _readings_numpy(values):
+    try:
+        values = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError(_SHAPE_ERROR) from None
+    if values.size == 0:
+        return values.reshape(0, 3)
+    if values.ndim != 2 or values.shape[1] != 3:
+        raise ValueError(_SHAPE_ERROR)
+    return values
+
+
+def _readings_python(values):
+    rows = []
+    for r in values:
+        try:
+            row = tuple(map(float, r))
+        except (TypeError, ValueError):
+            raise ValueError(_SHAPE_ERROR) from None
+        if len(row) != 3:
+            raise ValueError(_SHAPE_ERROR)
+        rows.append(row)
+    return rows
+
+
+def _batch_numpy(prev, curr, plan):
+    prev = _readings_numpy(prev)
+    curr = _readings_numpy(curr)
+    if prev.shape != curr.shape:
+        raise ValueError("Количество предыдущих и текущих показаний не совпадает.")
+
+    bad = (curr < prev).any(axis=1)
+    if bad.any():
+        raise _decreasing_error(np.flatnonzero(bad).tolist())
+
+    hot  = curr[:, 0] - prev[:, 0]
+    cold = curr[:, 1] - prev[:, 1]
+    elec = curr[:, 2] - prev[:, 2]
+    sewage = hot + cold
+
+    breakdown = {}
+    if plan.receipt:
+        table_comp, thermal_conv, thermal_tariff = plan.table_comp, plan.thermal_conv, plan.thermal_tariff
+        hot_cost_water_component   = hot * table_comp
+        hot_cost_thermal_component = hot * thermal_conv * thermal_tariff
+        hot_total_cost = hot_cost_water_component + hot_cost_thermal_component
+        breakdown.update({
+            'hot_water_component_unit': table_comp,
+            'thermal_component_unit': plan.thermal_unit,
+            'thermal_conv': thermal_conv,
+            'thermal_tariff_gcal': thermal_tariff,
+            'hot_water_component_cost': hot_cost_water_component,
+            'thermal_component_cost': hot_cost_thermal_component,
+            'hot_total_cost': hot_total_cost
+        })
+    else:
+        hot_total_cost = hot * plan.hot_water
+        breakdown['hot_total_cost'] = hot_total_cost
+
+    cold_cost = cold * plan.cold_rate
+    sewage_cost = sewage * plan.sewage_rate
+    elec_cost = elec * plan.elec_rate
+
+    total_cost = hot_total_cost + cold_cost + sewage_cost + elec_cost
+
+    breakdown.update({
+        'cold_cost': cold_cost,
+        'sewage_cost': sewage_cost,
+        'electricity_cost': elec_cost,
+        'total_cost': total_cost
+    })
+    return total_cost, hot, cold, elec, breakdown
+
+
+def _batch_python(prev, curr, plan):
+    prev = _readings_python(prev)
+    curr = _readings_python(curr)
+    if len(prev) != len(curr):
+        raise ValueError("Количество предыдущих и текущих показаний не совпадает.")
+
+    bad = [i for i, (p, c) in enumerate(zip(prev, curr)) if any(cv < pv for cv, pv in zip(c, p))]
+    if bad:
+        raise _decreasing_error(bad)
+
+    hot  = array('d', (c[0] - p[0] for p, c in zip(prev, curr)))
+    cold = array('d', (c[1] - p[1] for p, c in zip(prev, curr)))
+    elec = array('d', (c[2] - p[2] for p, c in zip(prev, curr)))
+
+    breakdown = {}
+    if plan.receipt:
+        table_comp, thermal_conv, thermal_tariff = plan.table_comp, plan.thermal_conv, plan.thermal_tariff
+        water = array('d', (h * table_comp for h in hot))
+        thermal = array('d', (h * thermal_conv * thermal_tariff for h in hot))
+        hot_total_cost = array('d', map(float.__add__, water, thermal))
+        breakdown.update({
+            'hot_water_component_unit': table_comp,
+            'thermal_component_unit': plan.thermal_unit,
+            'thermal_conv': thermal_conv,
+            'thermal_tariff_gcal': thermal_tariff,
+            'hot_water_component_cost': water,
+            'thermal_component_cost': thermal,
+            'hot_total_cost': hot_total_cost
+        })
+    else:
+        hot_water = plan.hot_water
+        hot_total_cost = array('d', (h * hot_water for h in hot))
+        breakdown['hot_total_cost'] = hot_total_cost
+
+    cold_rate, sewage_rate, elec_rate = plan.cold_rate, plan.sewage_rate, plan.elec_rate
+    cold_cost = array('d', (c * cold_rate for c in cold))
+    sewage_cost = array('d', ((h + c) * sewage_rate for h, c in zip(hot, cold)))
+    elec_cost = array('d', (e * elec_rate for e in elec))
+
+    total_cost = array('d', (h + c + s + e for h, c, s, e in
+                             zip(hot_total_cost, cold_cost, sewage_cost, elec_cost)))
+
+    breakdown.update({
+        'cold_cost': cold_cost,
+        'sewage_cost': sewage_cost,
+        'electricity_cost': elec_cost,
+        'total_cost': total_cost
+    })
+    return total_cost, hot, cold, elec, breakdown
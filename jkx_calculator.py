@@ -1,148 +1,53 @@
-import os
-import json
-import csv
-from datetime import datetime, timedelta
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import customtkinter as ctk
-from tkinter import messagebox
+from tkinter import messagebox, filedialog
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import matplotlib.dates as mdates
 
-# --- Paths & Config ---
-BASE_DIR     = os.path.dirname(os.path.abspath(__file__))
-CONFIG_PATH  = os.path.join(BASE_DIR, 'config.json')
-HISTORY_FILE = os.path.join(BASE_DIR, 'utility_history.csv')
-
-def load_config(path):
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-config = load_config(CONFIG_PATH)
-COEFF  = config['coefficients']
+# Расчёт и история живут в jkx_core (без GUI); имена реэкспортируются для совместимости
+from jkx_aggregate import BUCKET_TITLES, aggregate_history
+from jkx_stats import format_stats, history_stats
+from jkx_export import export_history
+from jkx_core import (
+    BASE_DIR, CONFIG_PATH, HISTORY_FILE, load_config, get_config, _parse_date,
+    init_files, history_store, read_history, write_new_values, get_last_readings,
+    calculate_utility_cost, get_plan, format_result, config_generation, ConflictError,
+    PERIODS, period_cutoff,
+)
+
+config = get_config()
 UI_CFG = config.get('ui', {})
 
-# --- Date parsing helper ---
-def _parse_date(s: str) -> datetime:
-    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%d", "%d.%m.%YT%H:%M:%S", "%d.%m.%Y"):
-        try:
-            return datetime.strptime(s, fmt)
-        except ValueError:
-            continue
-    raise ValueError(f"Unknown date format: {s}")
-
-# --- Init CSV if missing ---
-def init_files():
-    if not os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, 'w', newline='', encoding='utf-8') as f:
-            w = csv.writer(f, delimiter=';')
-            w.writerow([
-                'date',
-                'hot_curr',    # текущее Горячая
-                'cold_curr',   # текущее Холодная
-                'elec_curr',   # текущее Электричество
-                'hot_usage',   # расход Горячая
-                'cold_usage',  # расход Холодная
-                'elec_usage',  # расход Электричество
-                'total_cost'   # итоговая стоимость
-            ])
-
-# --- Read/Write History ---
-def read_history():
-    dates, hot_c, cold_c, elec_c = [], [], [], []
-    hot_u, cold_u, elec_u, totals = [], [], [], []
-    with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f, delimiter=';')
-        for row in reader:
-            dates.append(_parse_date(row['date']))
-            hot_c.append(float(row['hot_curr']))
-            cold_c.append(float(row['cold_curr']))
-            elec_c.append(float(row['elec_curr']))
-            hot_u.append(float(row['hot_usage']))
-            cold_u.append(float(row['cold_usage']))
-            elec_u.append(float(row['elec_usage']))
-            totals.append(float(row['total_cost']))
-    return dates, hot_c, cold_c, elec_c, hot_u, cold_u, elec_u, totals
-
-def write_new_values(curr, usage, total):
-    row = [
-        datetime.now().isoformat(timespec='seconds'),
-        curr[0], curr[1], curr[2],
-        usage[0], usage[1], usage[2],
-        total
-    ]
-    with open(HISTORY_FILE, 'a', newline='', encoding='utf-8') as f:
-        csv.writer(f, delimiter=';').writerow(row)
-
-def get_last_readings():
-    dates, hot_c, cold_c, elec_c, *_ = read_history()
-    if not dates:
-        return [0.0, 0.0, 0.0]
-    return [hot_c[-1], cold_c[-1], elec_c[-1]]
-
-# --- Calculation (по квитанции, без округлений) ---
-def calculate_utility_cost(prev, curr):
-    if any(c < p for c, p in zip(curr, prev)):
-        raise ValueError("Показания не могут быть меньше предыдущих!")
-    hot   = curr[0] - prev[0]
-    cold  = curr[1] - prev[1]
-    elec  = curr[2] - prev[2]
-    sewage = hot + cold
-
-    breakdown = {}
-
-    # Приоритет: формула "по квитанции" (table component + conversion * tariff_gcal)
-    if all(k in COEFF for k in ('thermal_conversion', 'thermal_tariff_gcal', 'hot_water_table_component')):
-        table_comp = float(COEFF['hot_water_table_component'])
-        thermal_conv = float(COEFF['thermal_conversion'])
-        thermal_tariff = float(COEFF['thermal_tariff_gcal'])
-
-        # Без промежуточных округлений — сохраняем максимальную точность
-        hot_cost_water_component   = hot * table_comp
-        hot_cost_thermal_component = hot * thermal_conv * thermal_tariff
-        hot_total_cost = hot_cost_water_component + hot_cost_thermal_component
-        hot_unit_used = table_comp + thermal_conv * thermal_tariff
-
-        breakdown.update({
-            'hot_water_component_unit': table_comp,
-            'thermal_component_unit': thermal_conv * thermal_tariff,
-            'thermal_conv': thermal_conv,
-            'thermal_tariff_gcal': thermal_tariff,
-            'hot_water_component_cost': hot_cost_water_component,
-            'thermal_component_cost': hot_cost_thermal_component,
-            'hot_total_cost': hot_total_cost
-        })
-
-    # Если квитанционная формула отсутствует, но задан единый тариф — используем его (fallback)
-    elif 'hot_water' in COEFF:
-        hot_water_unit = float(COEFF.get('hot_water', 0.0))
-        hot_total_cost = hot * hot_water_unit
-        breakdown.update({
-            'hot_total_cost': hot_total_cost
-        })
-    else:
-        # Нету ни квитанционной формулы, ни единого тарифа — это ошибка конфигурации
-        raise ValueError("В config отсутствуют поля для расчёта горячей воды. "
-                         "Нужны либо thermal_conversion + thermal_tariff_gcal + hot_water_table_component, "
-                         "либо hot_water в coefficients.")
-
-    cold_cost = cold * COEFF.get('cold_water', 0.0)
-    sewage_cost = sewage * COEFF.get('sewage', 0.0)
-    elec_cost = elec * COEFF.get('electricity', 0.0)
-
-    total_cost = hot_total_cost + cold_cost + sewage_cost + elec_cost
-
-    breakdown.update({
-        'cold_cost': cold_cost,
-        'sewage_cost': sewage_cost,
-        'electricity_cost': elec_cost,
-        'total_cost': total_cost
-    })
-
-    return total_cost, hot, cold, elec, breakdown
+def __getattr__(name):
+    # COEFF — коэффициенты действующего config (он перечитывается на ходу), как jkx_core.COEFF
+    if name == 'COEFF':
+        return get_config()['coefficients']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+SERIES_LABELS = ('Горячая, м³','Холодная, м³','Электричество, кВт·ч')
+SORT_MODES = {"Дата ↓":('date',True), "Дата ↑":('date',False),
+              "Сумма ↓":('cost',True), "Сумма ↑":('cost',False)}
+TABLE_PAGE_SIZE = 25
+IO_POLL_MS = 30
+BAR_MAX_TICKS = 24
+DATE_TICK_FORMATS = {'month':'%m.%Y', 'year':'%Y'}
+
+def _bucket_label(d, bucket):
+    if bucket=='year': return str(d.year)
+    if bucket=='month': return d.strftime('%Y-%m')
+    return str(d)
 
 # --- Main Application ---
 class UtilityApp(ctk.CTk):
     def _reset_form(self):
+        # Сохранение ещё идёт — сбросим форму, когда станут известны новые показания
+        if self._saving:
+            self._reset_pending=True
+            self.btn_reset.configure(state="disabled")
+            return
         # включаем поля и заполняем их последними сохранёнными показаниями
         for i, ent in enumerate(self.entries):
             ent.configure(state="normal")
@@ -172,6 +77,16 @@ class UtilityApp(ctk.CTk):
         init_files()
         self.prev_values = get_last_readings()
 
+        # Вся работа с историей — в одном фоновом потоке (он же упорядочивает доступ к файлу),
+        # результаты забираются в потоке Tk опросом через after()
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jkx-io")
+        self._busy = 0
+        self._pending = {}         # future -> нужно ли дождаться его при закрытии окна
+        self._closing = threading.Event()
+        self._saving = False
+        self._reset_pending = False
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
         # Theme switch
         self.theme_switch = ctk.CTkOptionMenu(
             self, values=["light","dark"], command=self._on_theme_change
@@ -194,6 +109,44 @@ class UtilityApp(ctk.CTk):
         self._build_calc_tab()
         self._build_history_tab()
 
+    def _on_close(self):
+        # Дожидаемся только записи в историю: остальное из очереди снимаем,
+        # а идущий экспорт прерывается по _closing
+        self._closing.set()
+        for future, keep in self._pending.items():
+            if not keep: future.cancel()
+        self._io.shutdown(wait=True)
+        self.destroy()
+
+    def _run_io(self, fn, on_done, *args, on_error=None, keep=False):
+        future=self._io.submit(fn, *args)
+        self._pending[future]=keep
+        self._set_busy(+1)
+        self.after(IO_POLL_MS, self._poll_io, future, on_done, on_error)
+
+    def _poll_io(self, future, on_done, on_error):
+        if not future.done():
+            self.after(IO_POLL_MS, self._poll_io, future, on_done, on_error)
+            return
+        self._pending.pop(future, None)
+        self._set_busy(-1)
+        try:
+            result=future.result()
+        except Exception as e:
+            # Любая ошибка фоновой задачи — иначе, например, _saving так и останется True
+            msg=str(e) if isinstance(e, (ValueError, OSError)) else f"{type(e).__name__}: {e}"
+            messagebox.showerror("Ошибка", msg)
+            if on_error: on_error(e)
+            return
+        on_done(result)
+
+    def _set_busy(self, delta):
+        self._busy+=delta
+        if self._busy>0:
+            self.busy_bar.grid(); self.busy_bar.start()
+        else:
+            self.busy_bar.stop(); self.busy_bar.grid_remove()
+
     def _on_theme_change(self, mode):
         ctk.set_appearance_mode(mode)
 
@@ -226,6 +179,11 @@ class UtilityApp(ctk.CTk):
         )
         self.btn_reset.grid(row=4, column=0, columnspan=2, sticky="ew", pady=(0,10), padx=20)
 
+        # индикатор фоновой работы с историей
+        self.busy_bar = ctk.CTkProgressBar(frame, mode="indeterminate")
+        self.busy_bar.grid(row=5, column=0, columnspan=2, sticky="ew", pady=(0,10), padx=20)
+        self.busy_bar.grid_remove()
+
         self.result_lbl = ctk.CTkLabel(tab, text="", justify="left")
         self.result_lbl.grid(row=1, column=0, sticky="nw", padx=20, pady=(0,10))
 
@@ -244,7 +202,9 @@ class UtilityApp(ctk.CTk):
                     raise ValueError("Введите все три текущих показания.")
                 curr.append(float(txt))
 
-            total, hu, cu, eu, breakdown = calculate_utility_cost(self.prev_values, curr)
+            # план берём один раз: расчёт и текст результата — по одним и тем же ставкам
+            plan = get_plan()
+            total, hu, cu, eu, breakdown = plan.bill(self.prev_values, curr)
             if hu==0 and cu==0 and eu==0:
                 raise ValueError("Показания совпадают с предыдущими — нет изменений.")
         except ValueError as e:
@@ -256,62 +216,43 @@ class UtilityApp(ctk.CTk):
         self.btn_copy.configure(state="normal")
         self.btn_reset.configure(state="normal")
 
-        # Составляем детализированный текст результата — без округлений (максимальная точность)
-        lines = []
-        lines.append(f"Итоговая стоимость: {breakdown['total_cost']} ₽")
-        # горячая вода с возможным разложением (по квитанции)
-        if 'hot_water_component_cost' in breakdown and 'thermal_component_cost' in breakdown:
-            lines.append(f"Горячая вода: {hu} м³  — всего {breakdown['hot_total_cost']} ₽")
-            lines.append(f"  • Компонент горячей воды: {breakdown['hot_water_component_unit']} ₽/м³ → {breakdown['hot_water_component_cost']} ₽")
-            lines.append(f"  • Компонент тепловой энергии: {breakdown['thermal_component_unit']} ₽/м³ → {breakdown['thermal_component_cost']} ₽")
-            lines.append(f"  (итого тариф на горячую: {breakdown['hot_water_component_unit'] + breakdown['thermal_component_unit']} ₽/м³)")
-        else:
-            lines.append(f"Горячая вода: {hu} м³ → {breakdown['hot_total_cost']} ₽ (тариф {COEFF.get('hot_water')} ₽/м³)")
-
-        lines.append(f"Холодная вода: {cu} м³ → {breakdown['cold_cost']} ₽ (тариф {COEFF.get('cold_water')} ₽/м³)")
-        lines.append(f"Канализация (горячая+холодная = {hu+cu} м³) → {breakdown['sewage_cost']} ₽ (тариф {COEFF.get('sewage')} ₽/м³)")
-        lines.append(f"Электричество: {eu} кВт·ч → {breakdown['electricity_cost']} ₽ (тариф {COEFF.get('electricity')} ₽/кВт·ч)")
-
-        # Формула горячей воды: приоритет — формула по квитанции
-        thermal_conv = COEFF.get('thermal_conversion')
-        thermal_tariff = COEFF.get('thermal_tariff_gcal')
-        table_comp = COEFF.get('hot_water_table_component')
-        if thermal_conv and thermal_tariff and table_comp:
-            # формула на 1 м³ (по квитанции) — без округлений
-            one_m3 = table_comp + thermal_conv * thermal_tariff
-            lines.append("")
-            lines.append("Формула (по квитанции) для 1 м³ горячей воды:")
-            lines.append(f"  1 × {table_comp} + {thermal_conv} × {thermal_tariff} = {one_m3} ₽/м³")
-            # формула для текущего объёма
-            comp_water = hu * table_comp
-            comp_thermal = hu * thermal_conv * thermal_tariff
-            lines.append(f"Формула для текущего объёма ({hu} м³):")
-            lines.append(f"  {hu}×{table_comp} + {hu}×{thermal_conv}×{thermal_tariff} = {comp_water} + {comp_thermal} = {comp_water + comp_thermal} ₽")
-        elif 'hot_water_component_unit' in breakdown and 'thermal_component_unit' in breakdown:
-            # (на случай fallback на единый тариф или прочее)
-            wc = breakdown.get('hot_water_component_unit')
-            tc = breakdown.get('thermal_component_unit')
-            one_m3 = (wc or 0) + (tc or 0)
-            lines.append("")
-            lines.append("Формула (компоненты тарифа):")
-            lines.append(f"  1 × ({wc} + {tc}) = {one_m3} ₽/м³")
-            lines.append(f"  Для {hu} м³: {hu}×{wc} + {hu}×{tc} = {breakdown.get('hot_water_component_cost')} + {breakdown.get('thermal_component_cost')} = {breakdown.get('hot_total_cost')} ₽")
-        else:
-            # fallback — показать единичный тариф
-            lines.append("")
-            lines.append(f"Формула (простой тариф): 1 × {COEFF.get('hot_water')} ₽/м³ = {COEFF.get('hot_water')} ₽/м³")
-            lines.append(f"Для {hu} м³: {hu} × {COEFF.get('hot_water')} = {breakdown['hot_total_cost']} ₽")
+        lines = format_result(hu, cu, eu, breakdown, plan)
+        self.result_lbl.configure(text="\n".join(lines))
 
-        # Для проверки — формула в одну строку
-        lines.append(f"\nПроверка: {breakdown['hot_total_cost']} + {breakdown['cold_cost']} + {breakdown['sewage_cost']} + {breakdown['electricity_cost']} = {breakdown['total_cost']} ₽")
+        # Сохраняем в фоне, по готовности — переключаемся
+        self._saving = True
+        self._run_io(self._save_values, self._on_saved, curr, [hu, cu, eu], total, self.prev_values,
+                     on_error=self._on_save_failed, keep=True)
 
-        self.result_lbl.configure(text="\n".join(lines))
+    def _save_values(self, curr, usage, total, prev):
+        # фоновый поток; запись — только если история не изменилась с момента расчёта
+        write_new_values(curr, usage, total, prev=prev)
+        return get_last_readings()
 
-        # Сохраняем и переключаемся
-        write_new_values(curr, [hu, cu, eu], total)
-        self.prev_values = get_last_readings()
-        self.tabview.set("История")
+    def _on_saved(self, prev_values):
+        self._saving = False
+        self.prev_values = prev_values
         self._draw_history()
+        if self._reset_pending:
+            self._reset_pending = False
+            self._reset_form()
+        else:
+            self.tabview.set("История")
+
+    def _on_save_failed(self, error):
+        self._saving = False
+        self._reset_pending = False
+        if isinstance(error, ConflictError):
+            # историю дописали из другого окна или импорта — считаем от новых показаний
+            self.prev_values = error.last
+            for i, ent in enumerate(self.entries):
+                ent.configure(placeholder_text=str(self.prev_values[i]))
+        # результат не сохранён (и мог быть посчитан от устаревших показаний) — копировать нечего
+        self.result_lbl.configure(text="")
+        self.btn_copy.configure(state="disabled")
+        for e in self.entries: e.configure(state="normal")
+        self.btn_calc.configure(state="normal")
+        self.btn_reset.configure(state="normal")
 
     def _copy_result(self):
         # Формируем расширенный текст для копирования: предыдущие показания, текущие, полная формула горячей воды
@@ -353,7 +294,7 @@ class UtilityApp(ctk.CTk):
         ctrl.pack(fill="x", padx=20, pady=(10,0))
 
         self.period_option=ctk.CTkOptionMenu(
-            ctrl, values=["Все","3мес.","6мес.","1год"],
+            ctrl, values=list(PERIODS),
             command=lambda v: self._draw_history()
         )
         self.period_option.set("Все"); self.period_option.pack(side="left", padx=10)
@@ -364,77 +305,238 @@ class UtilityApp(ctk.CTk):
         )
         self.view_option.set("Общий"); self.view_option.pack(side="left", padx=10)
 
+        self.btn_export=ctk.CTkButton(ctrl, text="Экспорт…", width=100, command=self._export_history)
+        self.btn_export.pack(side="right", padx=10)
+
+        # Сводка по всей истории: средний расход, месяц к месяцу, предупреждения
+        self.stats_lbl=ctk.CTkLabel(tab, text="", justify="left", anchor="w")
+        self.stats_lbl.pack(fill="x", padx=30, pady=(10,0))
+
         self.hist_frame=ctk.CTkScrollableFrame(tab)
         self.hist_frame.pack(fill="both", expand=True, padx=20, pady=10)
+        self.table_frame=ctk.CTkFrame(self.hist_frame, fg_color="transparent")
+        self.table_frame.pack(fill="x")
+
+        # Кэш подготовленных рядов по (период, вид); сбрасывается при изменении истории
+        self._series_cache={}
+        self._cache_version=None
+        self._table_period=None
+        self._history_token=0
+        self._chart_view=None
+        self._build_history_table()
+        self._build_history_chart()
         self._draw_history()
 
-    def _draw_history(self):
-        for w in self.hist_frame.winfo_children(): w.destroy()
-
-        dates, hot_c, cold_c, elec_c, hot_u, cold_u, elec_u, totals = read_history()
-        period=self.period_option.get()
-        if period!="Все":
-            days={"3мес.":90,"6мес.":180,"1год":365}[period]
-            cutoff=datetime.now()-timedelta(days=days)
-            filtered=[(d,hu,cu,eu,t) for d,hu,cu,eu,t in zip(dates,hot_u,cold_u,elec_u,totals) if d>=cutoff]
-            if filtered:
-                dates,hot_u,cold_u,elec_u,totals=zip(*filtered)
-            else:
-                dates,hot_u,cold_u,elec_u,totals=[],[],[],[],[]
-
-        # Таблица
-        ctk.CTkLabel(self.hist_frame,
+    def _build_history_table(self):
+        # Постоянный набор строк: на экране только одна страница истории,
+        # строки страницы читаются из HistoryStore по индексу
+        bar=ctk.CTkFrame(self.table_frame, fg_color="transparent")
+        bar.pack(fill="x", padx=10, pady=(5,0))
+        self.sort_option=ctk.CTkSegmentedButton(
+            bar, values=list(SORT_MODES),
+            command=lambda v: self._show_table_page(0)
+        )
+        self.sort_option.set("Дата ↓"); self.sort_option.pack(side="left")
+        self.btn_next=ctk.CTkButton(bar, text="▶", width=30,
+            command=lambda: self._show_table_page(self._table_page+1))
+        self.btn_next.pack(side="right")
+        self.page_lbl=ctk.CTkLabel(bar, text="")
+        self.page_lbl.pack(side="right", padx=10)
+        self.btn_prev=ctk.CTkButton(bar, text="◀", width=30,
+            command=lambda: self._show_table_page(self._table_page-1))
+        self.btn_prev.pack(side="right")
+
+        ctk.CTkLabel(self.table_frame,
             text="Дата | Расход Г | Расход Х | Расход Э | Итого",
             font=('Segoe UI',12,'bold')
         ).pack(anchor='nw', padx=10, pady=(5,2))
-        for d,hu,cu,eu,t in zip(dates,hot_u,cold_u,elec_u,totals):
-            ctk.CTkLabel(self.hist_frame,
-                text=f"{d.date()} | {hu} | {cu} | {eu} | {t}"
-            ).pack(anchor='nw', padx=10)
+        self.table_rows=[ctk.CTkLabel(self.table_frame, text="") for _ in range(TABLE_PAGE_SIZE)]
+        for lbl in self.table_rows: lbl.pack(anchor='nw', padx=10)
+        self._table_page=0
+
+    def _period_cutoff(self, period):
+        return period_cutoff(period)
+
+    def _table_request(self, page):
+        sort, descending=SORT_MODES[self.sort_option.get()]
+        return self._period_cutoff(self.period_option.get()), page, sort, descending
+
+    def _load_table_page(self, since, page, sort, descending):
+        # фоновый поток: только строки одной страницы
+        store=history_store()
+        total=store.count(since=since)
+        pages=max(1, -(-total//TABLE_PAGE_SIZE))
+        page=min(max(page,0), pages-1)
+        rows=store.page(page*TABLE_PAGE_SIZE, TABLE_PAGE_SIZE, since=since, sort=sort, descending=descending)
+        return rows, page, pages, total
+
+    def _fill_table(self, result):
+        rows, page, pages, total = result
+        self._table_page=page
+        for i, lbl in enumerate(self.table_rows):
+            if i<len(rows):
+                d, _, _, _, hu, cu, eu, t = rows[i]
+                lbl.configure(text=f"{d.date()} | {hu} | {cu} | {eu} | {t}")
+            else:
+                lbl.configure(text="")
+        self.page_lbl.configure(text=f"{page+1} / {pages}  (записей: {total})")
+        self.btn_prev.configure(state="normal" if page>0 else "disabled")
+        self.btn_next.configure(state="normal" if page<pages-1 else "disabled")
+
+    def _show_table_page(self, page):
+        self._run_io(self._load_table_page, self._fill_table, *self._table_request(page))
+
+    def _build_history_chart(self):
+        # Фигура, оси и линии создаются один раз — дальше только обновляются данные
+        self.fig=Figure(dpi=100)
+        self.ax_line=self.fig.add_subplot(111)
+        self.ax_bar=self.fig.add_subplot(111)
+        self.total_line,=self.ax_line.plot([],[],marker='o',color='C0',label='Итого, ₽')
+        self.series_lines=[self.ax_line.plot([],[],marker='o',color=f'C{i}',label=lbl)[0]
+                           for i, lbl in enumerate(SERIES_LABELS)]
+        self.bar_containers=[]
+        self.annotations=[]
+
+        self.ax_line.xaxis_date()
+        locator = mdates.AutoDateLocator(minticks=3, maxticks=7)
+        self.ax_line.xaxis.set_major_locator(locator)
+        self.ax_line.xaxis.set_major_formatter(mdates.DateFormatter('%d-%m'))
+        for ax in (self.ax_line, self.ax_bar):
+            ax.set_xlabel("Дата", fontsize=12)
+            ax.grid(True, linestyle='--', linewidth=0.7, alpha=0.5)
+            ax.tick_params(axis='x', labelrotation=45)
+
+        self.canvas=FigureCanvasTkAgg(self.fig, master=self.hist_frame)
+        self.canvas.get_tk_widget().pack(fill="both", padx=10, pady=10)
+
+    def _export_history(self):
+        # Выгрузка выбранного периода с детализацией по тарифам; формат — по расширению файла
+        path=filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV","*.csv"),("JSON Lines","*.jsonl"),("Колоночный (.jkxg)","*.jkxg")]
+        )
+        if not path:
+            return
+        period=self.period_option.get()
+        self._run_io(lambda: export_history(path, period=period, recalc=True, cancel=self._closing),
+                     lambda rows: messagebox.showinfo("Экспорт", f"Выгружено строк: {rows}\n{path}"))
+
+    def _history_series(self, period, view):
+        # кэш зависит и от истории, и от загруженного config (он перечитывается на ходу)
+        version=(history_store().version, config_generation())
+        if version!=self._cache_version:
+            self._series_cache.clear()
+            self._cache_version=version
+        cutoff_day=datetime.now().date()
+        key=(period, view, cutoff_day)
+        series=self._series_cache.get(key)
+        if series is None:
+            # На длинных периодах точки сворачиваются по дням/месяцам/годам
+            agg=aggregate_history(since=self._period_cutoff(period))
+            labels=agg['dates']
+            series={'labels':labels, 'x':mdates.date2num(labels) if labels else [],
+                    'bucket':agg['bucket']}
+            if view=="Общий":
+                series['values']=[agg['totals']]
+            else:
+                series['values']=[agg['hot'],agg['cold'],agg['elec']]
+            self._series_cache[key]=series
+        return series
 
-        # График
-        fig=Figure(dpi=100); ax=fig.add_subplot(111)
+    def _prepare_history(self, period, view, table_request):
+        # фоновый поток: чтение истории, свёртка, страница таблицы и сводка (дочитываются только новые строки)
+        return (self._history_series(period, view), self._load_table_page(*table_request),
+                format_stats(history_stats()))
 
-        labels=[d.date() for d in dates]
+    def _draw_history(self):
+        period=self.period_option.get()
         view=self.view_option.get()
+        # при смене периода таблица начинается с первой страницы
+        page=self._table_page if period==self._table_period else 0
+        self._table_period=period
+        self._history_token+=1
+        token=self._history_token
+        self._run_io(self._prepare_history,
+                     lambda result: self._apply_history(token, view, result),
+                     period, view, self._table_request(page))
+
+    def _apply_history(self, token, view, result):
+        # пока готовились данные, пользователь мог выбрать другой период или вид
+        if token!=self._history_token:
+            return
+        series, table, stats = result
+        self.stats_lbl.configure(text="\n".join(stats))
+        self._fill_table(table)
+        self._update_chart(view, series)
+
+    def _update_chart(self, view, series):
+        for a in self.annotations: a.remove()
+        self.annotations=[]
+        x=series['x']; labels=series['labels']
+
         if view=="Общий":
-            if totals: ax.plot(labels,totals,marker='o',label='Итого, ₽')
-            ax.set_title("Общая стоимость")
-            # Аннотации
-            for xi, yi in zip(labels, totals):
-                ax.annotate(f"{yi:.0f}", (xi, yi),
+            ax=self.ax_line
+            totals=series['values'][0]
+            self.total_line.set_data(x,totals)
+            self.total_line.set_visible(True)
+            for line in self.series_lines: line.set_visible(False)
+            # Подписи только у точек после свёртки — их не больше MAX_POINTS
+            for xi, yi in zip(x, totals):
+                self.annotations.append(ax.annotate(f"{yi:.0f}", (xi, yi),
                             textcoords="offset points", xytext=(0,5),
-                            ha='center', fontsize=9)
+                            ha='center', fontsize=9))
+            handles=[self.total_line] if totals else []
+            title, ylabel="Общая стоимость", "Стоимость, ₽"
         elif view=="Серии":
-            if hot_u: ax.plot(labels,hot_u,marker='o',label='Горячая, м³')
-            if cold_u: ax.plot(labels,cold_u,marker='o',label='Холодная, м³')
-            if elec_u: ax.plot(labels,elec_u,marker='o',label='Электричество, кВт·ч')
-            ax.set_title("Расходы по категориям")
+            ax=self.ax_line
+            self.total_line.set_visible(False)
+            handles=[]
+            for line, values in zip(self.series_lines, series['values']):
+                line.set_data(x,values)
+                line.set_visible(bool(values))
+                if values: handles.append(line)
+            title, ylabel="Расходы по категориям", "Расход"
         else:
-            w=0.2; x=list(range(len(labels)))
-            if hot_u: ax.bar([p-w for p in x],hot_u,w,alpha=0.7,label='Горячая, м³')
-            if cold_u: ax.bar(x,cold_u,w,alpha=0.7,label='Холодная, м³')
-            if elec_u: ax.bar([p+w for p in x],elec_u,w,alpha=0.7,label='Электричество, кВт·ч')
-            ax.set_xticks(x); ax.set_xticklabels(labels,rotation=45)
-            ax.set_title("Гистограмма расходов")
-
-        # Подписи осей и легенда
-        ax.set_xlabel("Дата", fontsize=12)
-        ax.set_ylabel("Стоимость, ₽" if view=="Общий" else "Расход", fontsize=12)
-        ax.legend()
-
-        # Сетка и даты
-        ax.grid(True, linestyle='--', linewidth=0.7, alpha=0.5)
-        locator = mdates.AutoDateLocator(minticks=3, maxticks=7)
-        ax.xaxis.set_major_locator(locator)
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d-%m'))
-        fig.autofmt_xdate(rotation=45, ha='right')
-        fig.tight_layout()
-
-        canvas=FigureCanvasTkAgg(fig, master=self.hist_frame)
-        canvas.get_tk_widget().pack(fill="both", padx=10, pady=10)
-        canvas.draw()
-
-if __name__=='__main__':
+            ax=self.ax_bar
+            w=0.2; pos=range(len(labels))
+            if self.bar_containers and len(self.bar_containers[0])==len(labels):
+                # то же число столбцов — только новые высоты
+                for bars, values in zip(self.bar_containers, series['values']):
+                    for rect, h in zip(bars, values): rect.set_height(h)
+            else:
+                for bars in self.bar_containers: bars.remove()
+                self.bar_containers=[
+                    ax.bar([p+off for p in pos],values,w,alpha=0.7,color=f'C{i}',label=lbl)
+                    for i, (off, values, lbl) in enumerate(zip((-w,0,w), series['values'], SERIES_LABELS))
+                ]
+            step=max(1, -(-len(labels)//BAR_MAX_TICKS))
+            ax.set_xticks(list(pos)[::step])
+            ax.set_xticklabels([_bucket_label(d, series['bucket']) for d in labels[::step]],rotation=45)
+            handles=self.bar_containers if labels else []
+            title="Гистограмма расходов"; ylabel="Расход"
+
+        if ax is self.ax_line:
+            ax.xaxis.set_major_formatter(mdates.DateFormatter(DATE_TICK_FORMATS.get(series['bucket'],'%d-%m')))
+        self.ax_line.set_visible(ax is self.ax_line)
+        self.ax_bar.set_visible(ax is self.ax_bar)
+        if series['bucket']:
+            title=f"{title} ({BUCKET_TITLES[series['bucket']]})"
+        ax.set_title(title)
+        ax.set_ylabel(ylabel, fontsize=12)
+        legend=ax.get_legend()
+        if legend: legend.remove()
+        if handles: ax.legend(handles=handles)
+        ax.relim(visible_only=True); ax.autoscale_view()
+
+        # Раскладку пересчитываем только при смене вида — подписи осей меняются лишь тогда
+        if view!=self._chart_view:
+            self._chart_view=view
+            self.fig.tight_layout()
+        self.canvas.draw_idle()
+
+def main():
     app=UtilityApp(config)
     app.mainloop()
+
+if __name__=='__main__':
+    main()
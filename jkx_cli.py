@@ -0,0 +1,200 @@
+import sys
+import json
+import argparse
+
+import jkx_core
+
+# Консольная утилита jkx-calc. Импортирует только ядро; customtkinter и matplotlib
+# подгружаются лишь командой `jkx-calc gui`.
+
+
+def _readings(text):
+    parts = text.replace(';', ' ').replace(',', ' ').split()
+    if len(parts) != 3:
+        raise ValueError(f"Ожидается три показания (горячая, холодная, электричество): {text.strip()!r}")
+    return [float(p) for p in parts]
+
+
+def _calc_one(prev, curr, args, out, expect=None):
+    # один план на весь расчёт: если config.json обновится посередине, текст не разойдётся с суммой
+    plan = jkx_core.get_plan()
+    total, hu, cu, eu, breakdown = plan.bill(prev, curr)
+    if hu == 0 and cu == 0 and eu == 0:
+        raise ValueError("Показания совпадают с предыдущими — нет изменений.")
+    if args.json:
+        out.write(json.dumps({'prev': prev, 'curr': curr, 'usage': [hu, cu, eu],
+                              'breakdown': breakdown}, ensure_ascii=False) + "\n")
+    else:
+        out.write("\n".join(jkx_core.format_result(hu, cu, eu, breakdown, plan)) + "\n")
+    if not args.dry_run:
+        jkx_core.write_new_values(curr, [hu, cu, eu], total, prev=expect)
+
+
+def cmd_calc(args):
+    jkx_core.init_files()
+    prev = args.prev if args.prev else jkx_core.get_last_readings()
+    if args.readings:
+        batches = [args.readings]
+    else:
+        # Показания из stdin: по одной тройке на строку, каждая — следующий расчёт
+        batches = (_readings(line) for line in sys.stdin if line.strip())
+    for curr in batches:
+        # без --prev расчёт идёт от истории — и дописывается, только если её никто не опередил
+        _calc_one(prev, curr, args, sys.stdout, None if args.prev else prev)
+        prev = curr
+    return 0
+
+
+def cmd_import(args):
+    import jkx_import
+    stats = jkx_import.import_readings(args.file, args.errors, args.batch_size, args.dry_run,
+                                       fsync=args.fsync)
+    print(f"Принято: {stats['accepted']}, отклонено: {stats['rejected']}, счётчиков: {stats['meters']}")
+    return 1 if stats['rejected'] else 0
+
+
+def cmd_reprice(args):
+    import jkx_reprice
+    coeff = jkx_reprice.load_plans(args.tariffs)
+    meters = None
+    if args.meter:
+        meters = [None if m == '-' else m for m in args.meter]
+    parallel = False if args.sequential else None
+    rows = jkx_reprice.reprice_history(coeff, args.output, meters, args.workers, args.shard_rows, parallel)
+    print(f"Пересчитано строк: {rows} → {args.output}")
+    return 0
+
+
+def cmd_stats(args):
+    import jkx_stats
+    meter = None if args.meter in (None, '-') else args.meter
+    stats = jkx_stats.history_stats(meter)
+    if args.json:
+        print(json.dumps(stats.summary(), ensure_ascii=False, indent=2))
+    else:
+        print("\n".join(jkx_stats.format_stats(stats, args.alerts)))
+    return 1 if stats.alerts and args.fail_on_alert else 0
+
+
+def cmd_export(args):
+    import jkx_export
+    since = jkx_core._parse_date(args.since) if args.since else None
+    until = jkx_core._parse_date(args.until) if args.until else None
+    meter = None if args.meter in (None, '-') else args.meter
+    rows = jkx_export.export_history(args.output, args.format, since, until, meter, args.recalc,
+                                     args.period)
+    print(f"Выгружено строк: {rows} → {args.output}")
+    return 0
+
+
+def cmd_convert(args):
+    import jkx_columnar
+    rows = jkx_columnar.convert(args.source, args.target)
+    print(f"Записано строк: {rows} → {args.target}")
+    return 0
+
+
+def cmd_serve(args):
+    import asyncio
+    import jkx_service
+    try:
+        asyncio.run(jkx_service.serve(args.host, args.port, args.flush_ms / 1000, args.fsync))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_gui(args):
+    import jkx_calculator
+    jkx_calculator.main()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='jkx-calc', description="Калькулятор ЖКХ без графического интерфейса")
+    parser.add_argument('--config', help="путь к config.json")
+    parser.add_argument('--history', help="путь к utility_history.csv")
+    parser.add_argument('--history-dir', help="каталог историй отдельных счётчиков")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('calc', help="рассчитать стоимость и записать в историю")
+    p.add_argument('readings', nargs='*', type=float, metavar='VALUE',
+                   help="текущие показания: горячая холодная электричество (без них — читаются из stdin)")
+    p.add_argument('--prev', nargs=3, type=float, metavar=('HOT', 'COLD', 'ELEC'),
+                   help="предыдущие показания (по умолчанию — последняя запись истории)")
+    p.add_argument('--dry-run', action='store_true', help="только расчёт, без записи в историю")
+    p.add_argument('--json', action='store_true', help="вывод в JSON (по строке на расчёт)")
+    p.set_defaults(func=cmd_calc)
+
+    p = sub.add_parser('import', help="потоковый импорт показаний многих квартир из CSV/JSONL")
+    p.add_argument('file', help="CSV (meter;date;hot;cold;elec) или JSONL с теми же ключами")
+    p.add_argument('--errors', help="отчёт об отклонённых строках (по умолчанию <file>.errors.csv)")
+    p.add_argument('--batch-size', type=int, default=1000, help="строк одного счётчика на одну запись в историю")
+    p.add_argument('--dry-run', action='store_true', help="только проверка и расчёт, без записи")
+    p.add_argument('--fsync', choices=('never', 'batch', 'end'), default='never',
+                   help="ждать записи на диск: никогда, после каждой пачки или в конце")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser('reprice', help="пересчитать всю историю по другим тарифам")
+    p.add_argument('tariffs', help="JSON с тарифами (config.json, в т.ч. с tariff_plans, или словарь coefficients)")
+    p.add_argument('-o', '--output', required=True, help="куда записать результат (CSV)")
+    p.add_argument('--meter', action='append', help="только этот счётчик ('-' — основная история); можно несколько")
+    p.add_argument('--workers', type=int, help="процессов в пуле (по умолчанию — число CPU)")
+    p.add_argument('--shard-rows', type=int, default=20_000, help="строк истории на одну часть")
+    p.add_argument('--sequential', action='store_true', help="считать в одном процессе")
+    p.set_defaults(func=cmd_reprice)
+
+    p = sub.add_parser('stats', help="средний расход, месяц к месяцу, предупреждения")
+    p.add_argument('--meter', help="счётчик (по умолчанию — основная история)")
+    p.add_argument('--json', action='store_true', help="вывод в JSON")
+    p.add_argument('--alerts', type=int, default=10, help="сколько последних предупреждений показать")
+    p.add_argument('--fail-on-alert', action='store_true', help="код возврата 1, если есть предупреждения")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser('export', help="выгрузить историю за период в CSV, JSON Lines или .jkxg")
+    p.add_argument('output', help="файл; формат по расширению (.csv, .jsonl, .jkxg) или --format")
+    p.add_argument('--format', choices=('csv', 'jsonl', 'columnar'), help="формат выгрузки")
+    p.add_argument('--period', choices=jkx_core.PERIODS, help="период, как на вкладке «История»")
+    p.add_argument('--since', help="с даты (YYYY-MM-DD)")
+    p.add_argument('--until', help="по дату (YYYY-MM-DD)")
+    p.add_argument('--meter', help="счётчик (по умолчанию — основная история)")
+    p.add_argument('--recalc', action='store_true', help="добавить детализацию по тарифам из config.json")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('convert', help="история CSV ⇄ компактный двоичный формат .jkxc")
+    p.add_argument('source', help="utility_history.csv или файл .jkxc")
+    p.add_argument('target', help="файл .jkxc или новый CSV")
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser('serve', help="локальный HTTP-сервис расчёта (JSON)")
+    p.add_argument('--host', default='127.0.0.1', help="адрес (по умолчанию только локальный)")
+    p.add_argument('--port', type=int, default=8765, help="порт (0 — любой свободный)")
+    p.add_argument('--flush-ms', type=float, default=5.0, help="сколько собирать пачку записей в историю, мс")
+    p.add_argument('--fsync', action='store_true', help="ждать записи каждой пачки на диск")
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser('gui', help="запустить графическое приложение")
+    p.set_defaults(func=cmd_gui)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'readings', None) and len(args.readings) != 3:
+        parser.error("нужно ровно три показания: горячая холодная электричество")
+    if args.config:
+        jkx_core.CONFIG_PATH = args.config
+    if args.history:
+        jkx_core.HISTORY_FILE = args.history
+    if args.history_dir:
+        jkx_core.HISTORY_DIR = args.history_dir
+    try:
+        return args.func(args)
+    except (ValueError, OSError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
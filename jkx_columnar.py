@@ -0,0 +1,238 @@
+import os
+import csv
+import mmap
+import struct
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from jkx_history import HEADER, DateParser, HistoryStore, _EPOCH, _to_epoch
+
+try:
+    import numpy as np
+except ImportError:  # numpy необязателен — без него колонки отдаются как memoryview
+    np = None
+
+# Компактный двоичный формат истории (.jkxc) — для больших архивов, где восемь списков
+# из read_history() (datetime и float в отдельных объектах, 100+ байт на значение) не помещаются в память.
+#
+# Файл: заголовок '<8sq' (магия, число записей) и записи фиксированной длины '<q7d' —
+# дата в секундах от 1970-01-01 (int64) и семь float64 в порядке колонок CSV. Записи
+# отсортированы по дате. Чтение — через mmap без копирования: колонки — это представления
+# (numpy или memoryview с шагом) прямо поверх отображённого файла, 64 байта на строку.
+
+COLUMNAR_EXT = '.jkxc'
+COLUMNAR_MAGIC = b'JKXCOL1\0'
+_HEAD = struct.Struct('<8sq')
+_REC = struct.Struct('<q7d')
+_FIELDS = len(HEADER)          # 8 значений по 8 байт в записи
+WRITE_CHUNK = 8192             # записей на одну запись в файл
+
+if np is not None:
+    RECORD_DTYPE = np.dtype([(HEADER[0], '<i8')] + [(name, '<f8') for name in HEADER[1:]])
+
+
+def from_epoch(ts):
+    return _EPOCH + timedelta(seconds=int(ts))
+
+
+def to_datetimes(epochs):
+    """Колонка дат (секунды) → список datetime, например для графика."""
+    return [_EPOCH + timedelta(seconds=int(ts)) for ts in epochs]
+
+
+class ColumnarHistory:
+    """История в формате .jkxc, открытая через mmap только для чтения.
+
+    Колонки (`columns`, `query`) ссылаются на отображённый файл и действительны до close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mm = None
+        self._count = 0
+        self._cols = None
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEAD.size:
+                raise ValueError(f"{path}: не файл истории {COLUMNAR_EXT}")
+            magic, count = _HEAD.unpack(f.read(_HEAD.size))
+            if magic != COLUMNAR_MAGIC:
+                raise ValueError(f"{path}: не файл истории {COLUMNAR_EXT}")
+            # записи за пределами count — недописанный хвост после сбоя, их не учитываем
+            self._count = min(count, (size - _HEAD.size) // _REC.size)
+            if self._count:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._cols = None
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                pass  # колонки ещё используются — отображение закроется вместе с ними
+            self._mm = None
+
+    @property
+    def columns(self):
+        """Восемь колонок файла целиком: даты (int64, секунды), затем семь float64."""
+        if self._cols is None:
+            self._cols = self._map_columns()
+        return self._cols
+
+    def _map_columns(self):
+        n = self._count
+        if not n:
+            if np is not None:
+                return tuple([np.empty(0, 'i8')] + [np.empty(0, 'f8') for _ in HEADER[1:]])
+            return tuple([memoryview(b'').cast('q')] + [memoryview(b'').cast('d') for _ in HEADER[1:]])
+        if np is not None:
+            records = np.frombuffer(self._mm, dtype=RECORD_DTYPE, count=n, offset=_HEAD.size)
+            return tuple(records[name] for name in HEADER)
+        raw = memoryview(self._mm)[_HEAD.size:_HEAD.size + n * _REC.size]
+        as_int, as_float = raw.cast('q'), raw.cast('d')
+        return (as_int[0::_FIELDS],) + tuple(as_float[i::_FIELDS] for i in range(1, _FIELDS))
+
+    def _range(self, since, until):
+        dates = self.columns[0]
+        lo = bisect_left(dates, _to_epoch(since)) if since is not None else 0
+        hi = bisect_right(dates, _to_epoch(until)) if until is not None else len(dates)
+        return lo, max(lo, hi)
+
+    def query(self, since=None, until=None):
+        """Записи с датой в [since, until] — те же восемь колонок, что и read_history(),
+        но без копирования: даты в секундах (to_datetimes() переводит их в datetime)."""
+        lo, hi = self._range(since, until)
+        return tuple(col[lo:hi] for col in self.columns)
+
+    def count(self, since=None, until=None):
+        lo, hi = self._range(since, until)
+        return hi - lo
+
+    def last_reading(self):
+        """Показания [горячая, холодная, электричество] последней по дате записи или None."""
+        if not self._count:
+            return None
+        _, hot, cold, elec = (float(col[-1]) for col in self.columns[:4])
+        return [hot, cold, elec]
+
+    def rows(self, since=None, until=None):
+        """Строки периода [date (datetime), hot_curr, ..., total_cost] по одной."""
+        lo, hi = self._range(since, until)
+        for start in range(lo, hi, WRITE_CHUNK):
+            stop = min(start + WRITE_CHUNK, hi)
+            chunk = self._mm[_HEAD.size + start * _REC.size:_HEAD.size + stop * _REC.size]
+            for ts, *values in _REC.iter_unpack(chunk):
+                yield [from_epoch(ts), *values]
+
+
+# --- Writing ---
+def _records(rows):
+    parse = DateParser()
+    pack = _REC.pack
+    for row in rows:
+        date = row[0]
+        if isinstance(date, datetime):
+            ts = _to_epoch(date)
+        elif isinstance(date, str):
+            ts = _to_epoch(parse(date))
+        else:
+            ts = int(date)
+        yield ts, pack(ts, *map(float, row[1:_FIELDS]))
+
+
+def write_columnar(path, rows):
+    """Записать строки [date, hot_curr, ..., total_cost] в файл .jkxc; возвращает их число.
+
+    date — datetime, строка CSV или секунды. Порядок строк любой: файл сортируется по дате.
+    """
+    count = 0
+    in_order = True
+    last = None
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(_HEAD.pack(COLUMNAR_MAGIC, 0))
+        chunk = []
+        for ts, rec in _records(rows):
+            if last is not None and ts < last:
+                in_order = False
+            last = ts
+            chunk.append(rec)
+            if len(chunk) >= WRITE_CHUNK:
+                f.write(b''.join(chunk))
+                count += len(chunk)
+                chunk.clear()
+        f.write(b''.join(chunk))
+        count += len(chunk)
+        f.seek(0)
+        f.write(_HEAD.pack(COLUMNAR_MAGIC, count))
+    if not in_order:
+        _sort_file(tmp, count)
+    os.replace(tmp, path)
+    return count
+
+
+def _sort_file(path, count):
+    # Устойчивая сортировка по дате — как HistoryStore.query() для истории с датами не по порядку
+    with open(path, 'r+b') as f:
+        f.seek(_HEAD.size)
+        body = f.read(count * _REC.size)
+        if np is not None:
+            records = np.frombuffer(body, dtype=RECORD_DTYPE)
+            body = records[np.argsort(records[HEADER[0]], kind='stable')].tobytes()
+        else:
+            records = sorted(_REC.iter_unpack(body), key=lambda r: r[0])
+            body = b''.join(_REC.pack(*r) for r in records)
+        f.seek(_HEAD.size)
+        f.write(body)
+
+
+# --- Conversion ---
+def csv_rows(csv_path):
+    """Строки истории CSV в порядке файла, потоково (без загрузки всех колонок)."""
+    store = HistoryStore(csv_path)
+    for start, end in store.spans(WRITE_CHUNK):
+        for row in csv.reader(store._read_span(start, end), delimiter=';'):
+            if row:
+                yield row
+
+
+def csv_to_columnar(csv_path, path):
+    """utility_history.csv → .jkxc; возвращает число строк."""
+    return write_columnar(path, csv_rows(csv_path))
+
+
+def columnar_to_csv(path, csv_path):
+    """.jkxc → CSV истории (`;`, даты ISO); возвращает число строк."""
+    if os.path.exists(csv_path) and os.path.getsize(csv_path):
+        raise ValueError(f"{csv_path} уже существует")
+    store = HistoryStore(csv_path)
+    count = 0
+    with ColumnarHistory(path) as hist:
+        batch = []
+        for row in hist.rows():
+            batch.append(row)
+            if len(batch) >= WRITE_CHUNK:
+                store.extend(batch)
+                count += len(batch)
+                batch = []
+        store.extend(batch)
+        count += len(batch)
+    return count
+
+
+def convert(src, dst):
+    """Конвертация по расширению: *.jkxc → CSV или CSV → *.jkxc."""
+    if src.endswith(COLUMNAR_EXT) and not dst.endswith(COLUMNAR_EXT):
+        return columnar_to_csv(src, dst)
+    if dst.endswith(COLUMNAR_EXT) and not src.endswith(COLUMNAR_EXT):
+        return csv_to_columnar(src, dst)
+    raise ValueError(f"Один из файлов должен быть {COLUMNAR_EXT}, другой — CSV")
@@ -0,0 +1,256 @@
+import os
+import re
+import sys
+import json
+import csv
+import time
+import threading
+from datetime import datetime, timedelta
+
+from jkx_history import ConflictError, HistoryStore, _parse_date
+from jkx_tariffs import DEFAULT_PLAN, as_plan, load_tariffs
+
+# Ядро расчёта и истории без GUI: его импортируют и приложение (jkx_calculator.py),
+# и консольная утилита jkx-calc. customtkinter/matplotlib здесь не нужны.
+
+# --- Paths & Config ---
+BASE_DIR     = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH  = os.path.join(BASE_DIR, 'config.json')
+HISTORY_FILE = os.path.join(BASE_DIR, 'utility_history.csv')
+HISTORY_DIR  = os.path.join(BASE_DIR, 'history')   # истории отдельных квартир/счётчиков
+
+def load_config(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# config.json читается при первом обращении, а не при импорте, и перечитывается на ходу:
+# не чаще раза в CONFIG_CHECK_INTERVAL секунд проверяются mtime и размер файла. Новый config
+# сначала целиком проверяется (JSON + компиляция тарифов), потом подменяется одной ссылкой —
+# расчёт, взявший план, досчитывает по нему; новые расчёты идут уже по новому.
+# Испорченный config (например, сохранённый наполовину) не применяется — работаем со старым.
+CONFIG_CHECK_INTERVAL = 1.0
+
+class _ConfigSnapshot:
+    __slots__ = ('path', 'stamp', 'config', 'tariffs', 'generation')
+
+    def __init__(self, path, stamp, config, tariffs, generation):
+        self.path = path
+        self.stamp = stamp
+        self.config = config
+        self.tariffs = tariffs
+        self.generation = generation
+
+_snapshot = None
+_checked_at = 0.0
+_failed_stamp = None
+_reload_lock = threading.Lock()
+_config_listeners = []
+
+def _config_stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+def _current_config():
+    global _checked_at
+    snap = _snapshot
+    now = time.monotonic()
+    if snap is not None and snap.path == CONFIG_PATH and now - _checked_at < CONFIG_CHECK_INTERVAL:
+        return snap
+    _checked_at = now
+    return reload_config()
+
+def reload_config(force=False):
+    """Перечитать config.json, если он изменился (force — в любом случае); вернуть действующий снимок."""
+    global _snapshot, _failed_stamp
+    with _reload_lock:
+        old, path = _snapshot, CONFIG_PATH
+        same_file = old is not None and old.path == path
+        try:
+            stamp = _config_stamp(path)
+        except OSError:
+            if same_file:
+                return old   # файл на мгновение пропал (сохранение через переименование)
+            raise
+        if same_file and not force and stamp in (old.stamp, _failed_stamp):
+            return old
+        try:
+            config = load_config(path)
+            new = _ConfigSnapshot(path, stamp, config, load_tariffs(config),
+                                  old.generation + 1 if old is not None else 0)
+        except Exception as e:
+            # любая ошибка разбора или проверки (не только ValueError) — config не применяем
+            if not same_file:
+                raise
+            _failed_stamp = stamp
+            print(f"config.json не применён, действуют прежние тарифы: {e}", file=sys.stderr)
+            return old
+        _snapshot = new
+    for listener in list(_config_listeners):
+        listener(old.config if old is not None else None, new.config)
+    return new
+
+def add_config_listener(fn):
+    """fn(old, new) вызывается после подмены config — для сброса кэшей, производных от него."""
+    _config_listeners.append(fn)
+
+def get_config():
+    return _current_config().config
+
+def config_generation():
+    """Номер загруженной версии config — для ключей кэшей."""
+    return _current_config().generation
+
+# Тарифы компилируются один раз на загруженный config и подменяются вместе с ним
+def get_tariffs():
+    return _current_config().tariffs
+
+def get_plan(name=DEFAULT_PLAN, at=None):
+    return get_tariffs().plan(name, at)
+
+def __getattr__(name):
+    # config / COEFF / UI_CFG остаются доступны как атрибуты модуля, но загружаются лениво
+    if name == 'config':
+        return get_config()
+    if name == 'COEFF':
+        return get_config()['coefficients']
+    if name == 'UI_CFG':
+        return get_config().get('ui', {})
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# --- Periods ---
+# Периоды вкладки «История» и экспорта: название → сколько дней назад; "Все" — без ограничения
+PERIODS = ("Все", "3мес.", "6мес.", "1год")
+PERIOD_DAYS = {"3мес.": 90, "6мес.": 180, "1год": 365}
+
+def period_cutoff(period):
+    if period == "Все":
+        return None
+    try:
+        days = PERIOD_DAYS[period]
+    except KeyError:
+        raise ValueError(f"Неизвестный период: {period} (есть: {', '.join(PERIODS)})") from None
+    return datetime.now() - timedelta(days=days)
+
+# --- Init CSV if missing ---
+def init_files():
+    if not os.path.exists(HISTORY_FILE):
+        with open(HISTORY_FILE, 'w', newline='', encoding='utf-8') as f:
+            w = csv.writer(f, delimiter=';')
+            w.writerow([
+                'date',
+                'hot_curr',    # текущее Горячая
+                'cold_curr',   # текущее Холодная
+                'elec_curr',   # текущее Электричество
+                'hot_usage',   # расход Горячая
+                'cold_usage',  # расход Холодная
+                'elec_usage',  # расход Электричество
+                'total_cost'   # итоговая стоимость
+            ])
+
+# --- Read/Write History ---
+# Вся работа с CSV идёт через HistoryStore: индекс рядом с файлом избавляет
+# от полного перечитывания истории на каждый расчёт и перерисовку.
+# Без meter — основная история приложения (HISTORY_FILE); с meter — отдельный
+# файл HISTORY_DIR/<meter>.csv для каждой квартиры/счётчика. Открытыми держатся
+# не больше METER_STORE_CACHE историй счётчиков (давно не нужные вытесняются):
+# при импорте тысяч квартир индексы всех сразу в памяти не копятся.
+METER_STORE_CACHE = 64
+
+_store = None
+_meter_stores = {}   # meter → HistoryStore, в порядке последнего обращения
+_METER_RE = re.compile(r'[A-Za-z0-9_-][A-Za-z0-9_.-]*\Z')
+
+def meter_history_path(meter):
+    if not _METER_RE.match(str(meter)):
+        raise ValueError(f"Недопустимый идентификатор счётчика: {meter!r}")
+    return os.path.join(HISTORY_DIR, f"{meter}.csv")
+
+def list_meters():
+    try:
+        names = os.listdir(HISTORY_DIR)
+    except OSError:
+        return []
+    return sorted(n[:-4] for n in names if n.endswith('.csv'))
+
+def history_store(meter=None):
+    global _store
+    if meter is None:
+        if _store is None or _store.path != HISTORY_FILE:
+            _store = HistoryStore(HISTORY_FILE)
+        return _store
+    path = meter_history_path(meter)
+    store = _meter_stores.pop(meter, None)
+    if store is None or store.path != path:
+        store = HistoryStore(path)
+        while len(_meter_stores) >= METER_STORE_CACHE:
+            del _meter_stores[next(iter(_meter_stores))]
+    _meter_stores[meter] = store
+    return store
+
+def read_history(since=None, until=None, meter=None):
+    return history_store(meter).query(since, until)
+
+# prev — показания, от которых сделан расчёт: если историю успели дописать
+# (другое окно, импорт, сервис), строка не пишется — ConflictError
+def write_new_values(curr, usage, total, meter=None, prev=None):
+    row = [
+        datetime.now().isoformat(timespec='seconds'),
+        curr[0], curr[1], curr[2],
+        usage[0], usage[1], usage[2],
+        total
+    ]
+    history_store(meter).append(row, expect_last=prev)
+
+def get_last_readings(meter=None):
+    last = history_store(meter).last_reading()
+    if last is None:
+        return [0.0, 0.0, 0.0]
+    return last
+
+# --- Calculation (по квитанции, без округлений) ---
+# coeff — словарь coefficients или готовый TariffPlan; по умолчанию действующий план из config.json.
+# Сама формула — в TariffPlan.bill_usage (jkx_tariffs.py).
+def calculate_utility_cost(prev, curr, coeff=None):
+    plan = get_plan() if coeff is None else as_plan(coeff)
+    return plan.bill(prev, curr)
+
+# --- Result text ---
+def format_result(hu, cu, eu, breakdown, coeff=None):
+    plan = get_plan() if coeff is None else as_plan(coeff)
+    # Составляем детализированный текст результата — без округлений (максимальная точность)
+    lines = []
+    lines.append(f"Итоговая стоимость: {breakdown['total_cost']} ₽")
+    # горячая вода с возможным разложением (по квитанции)
+    if 'hot_water_component_cost' in breakdown and 'thermal_component_cost' in breakdown:
+        lines.append(f"Горячая вода: {hu} м³  — всего {breakdown['hot_total_cost']} ₽")
+        lines.append(f"  • Компонент горячей воды: {breakdown['hot_water_component_unit']} ₽/м³ → {breakdown['hot_water_component_cost']} ₽")
+        lines.append(f"  • Компонент тепловой энергии: {breakdown['thermal_component_unit']} ₽/м³ → {breakdown['thermal_component_cost']} ₽")
+        lines.append(f"  (итого тариф на горячую: {breakdown['hot_water_component_unit'] + breakdown['thermal_component_unit']} ₽/м³)")
+    else:
+        lines.append(f"Горячая вода: {hu} м³ → {breakdown['hot_total_cost']} ₽ (тариф {plan.hot_water} ₽/м³)")
+
+    lines.append(f"Холодная вода: {cu} м³ → {breakdown['cold_cost']} ₽ (тариф {plan.cold_rate} ₽/м³)")
+    lines.append(f"Канализация (горячая+холодная = {hu+cu} м³) → {breakdown['sewage_cost']} ₽ (тариф {plan.sewage_rate} ₽/м³)")
+    lines.append(f"Электричество: {eu} кВт·ч → {breakdown['electricity_cost']} ₽ (тариф {plan.elec_rate} ₽/кВт·ч)")
+
+    # Формула горячей воды: приоритет — формула по квитанции
+    if plan.receipt:
+        # формула на 1 м³ (по квитанции) — без округлений, ставка посчитана при загрузке тарифа
+        table_comp, thermal_conv, thermal_tariff = plan.table_comp, plan.thermal_conv, plan.thermal_tariff
+        lines.append("")
+        lines.append("Формула (по квитанции) для 1 м³ горячей воды:")
+        lines.append(f"  1 × {table_comp} + {thermal_conv} × {thermal_tariff} = {plan.hot_rate} ₽/м³")
+        # формула для текущего объёма
+        comp_water = breakdown['hot_water_component_cost']
+        comp_thermal = breakdown['thermal_component_cost']
+        lines.append(f"Формула для текущего объёма ({hu} м³):")
+        lines.append(f"  {hu}×{table_comp} + {hu}×{thermal_conv}×{thermal_tariff} = {comp_water} + {comp_thermal} = {breakdown['hot_total_cost']} ₽")
+    else:
+        # fallback — показать единичный тариф
+        lines.append("")
+        lines.append(f"Формула (простой тариф): 1 × {plan.hot_water} ₽/м³ = {plan.hot_water} ₽/м³")
+        lines.append(f"Для {hu} м³: {hu} × {plan.hot_water} = {breakdown['hot_total_cost']} ₽")
+
+    # Для проверки — формула в одну строку
+    lines.append(f"\nПроверка: {breakdown['hot_total_cost']} + {breakdown['cold_cost']} + {breakdown['sewage_cost']} + {breakdown['electricity_cost']} = {breakdown['total_cost']} ₽")
+    return lines
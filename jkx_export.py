@@ -0,0 +1,201 @@
+import io
+import os
+import csv
+import json
+import struct
+from array import array
+
+import jkx_core
+from jkx_history import HEADER, _to_epoch
+
+# Потоковый экспорт истории (и пересчитанной детализации) в CSV, JSON Lines и колоночный
+# формат по группам строк (.jkxg, по образцу Parquet). Строки идут генератором из
+# HistoryStore.iter_range, запись — через буфер фиксированного размера, поэтому память
+# не зависит от числа строк: в ней только текущая порция/группа.
+#
+# .jkxg: MAGIC, затем группы строк — в каждой колонки подряд (date — int64, секунды
+# от 1970-01-01; остальные — float64, NaN вместо пустых), в конце JSON-описание
+# (колонки, число строк и смещения колонок каждой группы), его длина '<q' и снова MAGIC.
+
+FORMATS = ('csv', 'jsonl', 'columnar')
+FORMAT_EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.json': 'jsonl', '.jkxg': 'columnar'}
+BREAKDOWN_COLUMNS = ['hot_total_cost', 'hot_water_component_cost', 'thermal_component_cost',
+                     'cold_cost', 'sewage_cost', 'electricity_cost', 'recalc_total']
+BUFFER_SIZE = 1 << 20       # байт в буфере записи
+ROW_GROUP = 16_384          # строк в группе колоночного формата
+COLUMNAR_MAGIC = b'JKXG1\0\0\0'
+_FOOTER_LEN = struct.Struct('<q')
+_NAN = float('nan')
+CANCEL_CHECK_ROWS = 4096    # как часто проверять отмену экспорта
+
+
+class ExportCancelled(Exception):
+    """Экспорт прерван (cancel установлен) — недописанный файл удалён."""
+
+
+def export_columns(recalc=False):
+    return HEADER + BREAKDOWN_COLUMNS if recalc else list(HEADER)
+
+
+def export_rows(since=None, until=None, meter=None, recalc=False):
+    """Строки истории за период по порядку дат; recalc — с детализацией по действующим тарифам.
+
+    Тарифы берутся один раз на весь экспорт: подмена config.json посередине его не затронет.
+    """
+    rows = jkx_core.history_store(meter).iter_range(since, until)
+    if not recalc:
+        yield from rows
+        return
+    tariffs = jkx_core.get_tariffs()
+    plan_at = tariffs.plan
+    for row in rows:
+        total, _, _, _, breakdown = plan_at(at=row[0]).bill_usage(row[4], row[5], row[6])
+        yield (*row, *(breakdown.get(k, _NAN) for k in BREAKDOWN_COLUMNS[:-1]), total)
+
+
+def _until_cancelled(rows, cancel):
+    for i, row in enumerate(rows):
+        if not i % CANCEL_CHECK_ROWS and cancel.is_set():
+            raise ExportCancelled()
+        yield row
+
+
+def _format_for(path, fmt):
+    if fmt is not None:
+        if fmt not in FORMATS:
+            raise ValueError(f"Неизвестный формат экспорта: {fmt} (есть: {', '.join(FORMATS)})")
+        return fmt
+    for ext, name in FORMAT_EXTENSIONS.items():
+        if path.lower().endswith(ext):
+            return name
+    raise ValueError(f"Не удалось определить формат по имени {path}; укажите его явно")
+
+
+# --- Writers ---
+def _blank_nan(rows, empty):
+    # компонентов горячей воды нет при простом тарифе: в тексте — пусто, а не nan
+    for row in rows:
+        yield tuple(empty if v != v else v for v in row)
+
+
+def _write_csv(f, columns, rows):
+    if len(columns) > len(HEADER):
+        rows = _blank_nan(rows, '')
+    text = io.TextIOWrapper(f, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(text, delimiter=';')
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow((row[0].isoformat(), *row[1:]))
+        count += 1
+    text.detach()
+    return count
+
+
+def _write_jsonl(f, columns, rows):
+    if len(columns) > len(HEADER):
+        rows = _blank_nan(rows, None)
+    keys = columns[1:]
+    dumps = json.dumps
+    count = 0
+    for row in rows:
+        record = {'date': row[0].isoformat()}
+        record.update(zip(keys, row[1:]))
+        f.write(dumps(record, ensure_ascii=False).encode('utf-8'))
+        f.write(b'\n')
+        count += 1
+    return count
+
+
+def _write_columnar(f, columns, rows):
+    f.write(COLUMNAR_MAGIC)
+    offset = len(COLUMNAR_MAGIC)
+    groups = []
+    count = 0
+
+    def flush(cols):
+        nonlocal offset
+        offsets = []
+        for col in cols:
+            offsets.append(offset)
+            data = col.tobytes()
+            f.write(data)
+            offset += len(data)
+        groups.append({'rows': len(cols[0]), 'offsets': offsets})
+
+    new_group = lambda: [array('q')] + [array('d') for _ in columns[1:]]
+    cols = new_group()
+    for row in rows:
+        cols[0].append(_to_epoch(row[0]))
+        for col, value in zip(cols[1:], row[1:]):
+            col.append(value)
+        count += 1
+        if len(cols[0]) >= ROW_GROUP:
+            flush(cols)
+            cols = new_group()
+    if cols[0]:
+        flush(cols)
+    footer = json.dumps({
+        'columns': [{'name': name, 'type': 'int64' if i == 0 else 'float64'} for i, name in enumerate(columns)],
+        'rows': count,
+        'row_groups': groups,
+    }).encode('utf-8')
+    f.write(footer)
+    f.write(_FOOTER_LEN.pack(len(footer)))
+    f.write(COLUMNAR_MAGIC)
+    return count
+
+
+_WRITERS = {'csv': _write_csv, 'jsonl': _write_jsonl, 'columnar': _write_columnar}
+
+
+def export_history(path, fmt=None, since=None, until=None, meter=None, recalc=False, period=None,
+                   cancel=None):
+    """Записать историю за период в файл; возвращает число строк.
+
+    fmt — 'csv', 'jsonl' или 'columnar' (по умолчанию — по расширению файла);
+    period — название периода как на вкладке «История» ("Все", "3мес.", ...), вместо since;
+    cancel — threading.Event: когда он установлен, экспорт прерывается (ExportCancelled).
+    """
+    fmt = _format_for(path, fmt)
+    if period is not None:
+        since = jkx_core.period_cutoff(period)
+    rows = export_rows(since, until, meter, recalc)
+    if cancel is not None:
+        rows = _until_cancelled(rows, cancel)
+    try:
+        with open(path, 'wb', buffering=BUFFER_SIZE) as f:
+            return _WRITERS[fmt](f, export_columns(recalc), rows)
+    except ExportCancelled:
+        os.remove(path)
+        raise
+
+
+# --- Reading .jkxg ---
+def read_columnar_footer(path):
+    with open(path, 'rb') as f:
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"{path}: не файл .jkxg")
+        f.seek(-(_FOOTER_LEN.size + len(COLUMNAR_MAGIC)), io.SEEK_END)
+        length = _FOOTER_LEN.unpack(f.read(_FOOTER_LEN.size))[0]
+        if f.read() != COLUMNAR_MAGIC:
+            raise ValueError(f"{path}: файл .jkxg не дописан")
+        f.seek(-(_FOOTER_LEN.size + len(COLUMNAR_MAGIC) + length), io.SEEK_END)
+        return json.loads(f.read(length))
+
+
+def iter_row_groups(path, columns=None):
+    """Группы строк файла .jkxg по одной: {колонка: array} — только запрошенные колонки."""
+    footer = read_columnar_footer(path)
+    names = [c['name'] for c in footer['columns']]
+    wanted = columns or names
+    with open(path, 'rb') as f:
+        for group in footer['row_groups']:
+            out = {}
+            for name in wanted:
+                i = names.index(name)
+                col = array('q' if i == 0 else 'd')
+                f.seek(group['offsets'][i])
+                col.frombytes(f.read(group['rows'] * col.itemsize))
+                out[name] = col
+            yield out
@@ -0,0 +1,551 @@
+import io
+import os
+import re
+import csv
+import zlib
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки между процессами нет, запись остаётся одним write()
+    fcntl = None
+
+HEADER = ['date', 'hot_curr', 'cold_curr', 'elec_curr',
+          'hot_usage', 'cold_usage', 'elec_usage', 'total_cost']
+
+# --- Sidecar-индекс ---
+# <history>.idx: magic, размер CSV на момент индексации, число записей, mtime CSV и отпечаток
+# последней проиндексированной строки (длина, crc32), затем по записи на строку истории
+# в порядке файла: (дата в секундах от эпохи, смещение строки в CSV).
+INDEX_MAGIC = b'JKXIDX2\0'
+_INDEX_HEAD = struct.Struct('<8sqqqqq')
+_INDEX_REC  = struct.Struct('<qq')
+_EPOCH = datetime(1970, 1, 1)
+_NO_READING = [0.0, 0.0, 0.0]
+
+
+class ConflictError(ValueError):
+    """Последние показания в истории не те, от которых считали: историю дописал кто-то другой."""
+
+    def __init__(self, last, expected):
+        super().__init__(f"История изменилась: последние показания {last}, а расчёт сделан от {expected}. "
+                         "Пересчитайте от новых показаний.")
+        self.last = last
+        self.expected = expected
+
+
+# --- Date parsing helper ---
+DATE_FORMATS = ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%d", "%d.%m.%YT%H:%M:%S", "%d.%m.%Y")
+
+_DOTTED_RE = re.compile(r'(\d\d)\.(\d\d)\.(\d\d\d\d)(?:T(\d\d):(\d\d):(\d\d))?\Z')
+
+
+def _strptime_any(s: str):
+    # Полный перебор форматов — медленный путь, нужен только при смене формата
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt), fmt
+        except ValueError:
+            continue
+    raise ValueError(f"Unknown date format: {s}")
+
+
+def _fast_iso(s: str):
+    # "%Y-%m-%dT%H:%M:%S" / "%Y-%m-%d"; всё остальное, что принял бы fromisoformat
+    # (смещение часового пояса, время без секунд, ...), отсекаем
+    n = len(s)
+    if n == 19:
+        if s[10] != 'T' or s[13] != ':' or s[16] != ':':
+            return None
+    elif n != 10:
+        return None
+    if s[4] != '-' or s[7] != '-':
+        return None
+    try:
+        d = datetime.fromisoformat(s)
+    except ValueError:
+        return None
+    return d if d.tzinfo is None else None
+
+
+def _fast_dotted(s: str):
+    # "%d.%m.%YT%H:%M:%S" / "%d.%m.%Y"
+    m = _DOTTED_RE.match(s)
+    if m is None:
+        return None
+    d, mo, y, hh, mi, ss = m.groups()
+    try:
+        if hh is None:
+            return datetime(int(y), int(mo), int(d))
+        return datetime(int(y), int(mo), int(d), int(hh), int(mi), int(ss))
+    except ValueError:
+        return None
+
+
+_FAST_PATHS = {
+    "%Y-%m-%dT%H:%M:%S": _fast_iso,
+    "%Y-%m-%d": _fast_iso,
+    "%d.%m.%YT%H:%M:%S": _fast_dotted,
+    "%d.%m.%Y": _fast_dotted,
+}
+
+
+class DateParser:
+    """Разбор дат одного файла: формат определяется по первой строке и запоминается.
+
+    Дальше строки идут через быстрый путь этого формата; полный перебор
+    DATE_FORMATS — только если строка в него не укладывается.
+    """
+
+    __slots__ = ('fast',)
+
+    def __init__(self):
+        self.fast = None
+
+    def __call__(self, s: str) -> datetime:
+        if self.fast is not None:
+            d = self.fast(s)
+            if d is not None:
+                return d
+        d, fmt = _strptime_any(s)
+        self.fast = _FAST_PATHS[fmt]
+        return d
+
+
+def _parse_date(s: str) -> datetime:
+    d = _fast_iso(s) or _fast_dotted(s)
+    if d is not None:
+        return d
+    return _strptime_any(s)[0]
+
+
+def _to_epoch(d: datetime) -> int:
+    return int((d - _EPOCH).total_seconds())
+
+
+def _empty_columns():
+    return [], [], [], [], [], [], [], []
+
+
+def read_span(path, start, end=None):
+    """Строки CSV из байтового диапазона [start, end) файла истории."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start) if end is not None else f.read()
+    return data.decode('utf-8').splitlines()
+
+
+class HistoryStore:
+    """История показаний в CSV (`;`) с индексом последней записи и дат рядом с файлом.
+
+    Последние показания читаются за O(1), выборка по периоду — за O(log N + k).
+    Существующий CSV без индекса индексируется при первом открытии; строки,
+    дописанные в CSV в обход хранилища, доиндексируются при следующем обращении.
+    """
+
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self.index_path = index_path or path + '.idx'
+        self._indexed_size = 0
+        self._mtime = None        # mtime CSV на момент индексации (нс)
+        self._tail = (0, 0)       # отпечаток последней строки: (длина, crc32)
+        self._ts = array('q')     # даты в порядке файла
+        self._offs = array('q')   # смещения строк в порядке файла
+        self._keys = self._ts     # отсортированные даты и соответствующие им смещения;
+        self._order = self._offs  # пока даты по порядку — это те же массивы, без копии
+        self._monotonic = True
+        self._cost_cache = None
+        self.generation = 0       # растёт, когда файл перезаписан (не только дописан)
+        self._stat = None         # (размер, mtime) CSV при последней проверке
+        self._writing = False     # внутри _locked(): других писателей сейчас нет
+        self._load_index()
+        self.refresh()
+
+    def __len__(self):
+        self.refresh()
+        return len(self._offs)
+
+    @property
+    def version(self):
+        """Меняется при любом изменении файла истории — ключ для инвалидации кэшей."""
+        self.refresh()
+        return self.generation, self._indexed_size
+
+    # --- Index maintenance ---
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return
+        if len(data) < _INDEX_HEAD.size:
+            return
+        magic, size, count, mtime, tail_len, tail_crc = _INDEX_HEAD.unpack_from(data)
+        body = data[_INDEX_HEAD.size:_INDEX_HEAD.size + count * _INDEX_REC.size]
+        if magic != INDEX_MAGIC or len(body) != count * _INDEX_REC.size:
+            return
+        recs = array('q')
+        recs.frombytes(body)
+        self._indexed_size = size
+        self._mtime = mtime
+        self._tail = (tail_len, tail_crc)
+        self._ts = recs[0::2]
+        self._offs = recs[1::2]
+        self._rebuild_sorted()
+
+    def _rebuild_sorted(self):
+        ts = self._ts
+        self._monotonic = all(ts[i] <= ts[i + 1] for i in range(len(ts) - 1))
+        if self._monotonic:
+            self._keys, self._order = self._ts, self._offs
+        else:
+            pairs = sorted(zip(ts, self._offs))
+            self._keys = [t for t, _ in pairs]
+            self._order = [o for _, o in pairs]
+
+    def _reset(self):
+        self.generation += 1
+        self._indexed_size = 0
+        self._mtime = None
+        self._tail = (0, 0)
+        self._ts, self._offs = array('q'), array('q')
+        self._keys, self._order = self._ts, self._offs
+        self._monotonic = True
+
+    def refresh(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            if self._offs:
+                self._reset()
+            return
+        size = st.st_size
+        if size == self._indexed_size and st.st_mtime_ns == self._mtime:
+            return
+        if (size, st.st_mtime_ns) == self._stat:
+            return  # файл не менялся с прошлой проверки (например, висит недописанная строка)
+        if size < self._indexed_size or not self._tail_is_consistent():
+            # Файл перезаписан — индекс строим заново
+            self._reset()
+            try:
+                os.remove(self.index_path)
+            except OSError:
+                pass
+        self._scan_tail(st.st_mtime_ns)
+        self._stat = (size, st.st_mtime_ns)
+
+    def _tail_is_consistent(self):
+        # Файл только дописывали, если последняя проиндексированная строка на месте
+        # и не изменилась; иначе смещения индекса указывают не туда
+        if not self._indexed_size:
+            return True
+        length, crc = self._tail
+        with open(self.path, 'rb') as f:
+            f.seek(self._indexed_size - length)
+            line = f.read(length)
+        return len(line) == length and zlib.crc32(line) == crc
+
+    def _final_line(self, f, line, end):
+        # Последняя строка файла без '\n': её либо ещё дописывают, либо файл просто так
+        # сохранён (так бывает с CSV, записанными не нами). Полная строка истории учитывается,
+        # если в этот момент никто не пишет: мы сами под блокировкой или блокировка свободна.
+        if line.count(b';') != len(HEADER) - 1:
+            return False
+        try:
+            [float(v) for v in line.split(b';')[1:]]
+        except ValueError:
+            return False
+        if self._writing or fcntl is None:
+            return True
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except OSError:
+            return False   # писатель держит блокировку — строку дописывают
+        try:
+            # пока брали блокировку, строку могли дописать до конца
+            return os.fstat(f.fileno()).st_size == end
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _scan_tail(self, mtime):
+        new = []
+        old_size = self._indexed_size
+        with open(self.path, 'rb') as f:
+            f.seek(self._indexed_size)
+            offset = self._indexed_size
+            skip_header = offset == 0
+            parse = DateParser()
+            tail = None
+            for line in f:
+                if not line.endswith(b'\n') and not self._final_line(f, line, offset + len(line)):
+                    break  # строку ещё дописывают — проиндексируем при следующем обращении
+                tail = line
+                start, offset = offset, offset + len(line)
+                if skip_header:
+                    skip_header = False
+                    continue
+                text = line.decode('utf-8').strip()
+                if not text:
+                    continue
+                new.append((_to_epoch(parse(text.split(';', 1)[0])), start))
+        self._add(new)
+        self._indexed_size = offset
+        self._mtime = mtime
+        if tail is not None:
+            self._tail = (len(tail), zlib.crc32(tail))
+        if new or offset != old_size:
+            self._write_index(new)
+
+    def _add(self, records):
+        for ts, off in records:
+            if self._monotonic and self._ts and ts < self._ts[-1]:
+                # первая дата не по порядку: отсортированные копии заводим только теперь
+                self._monotonic = False
+                self._keys, self._order = list(self._ts), list(self._offs)
+            self._ts.append(ts)
+            self._offs.append(off)
+            if not self._monotonic:
+                i = bisect_right(self._keys, ts)
+                self._keys.insert(i, ts)
+                self._order.insert(i, off)
+
+    def _write_index(self, new):
+        recs = array('q')
+        for ts, off in new:
+            recs.append(ts)
+            recs.append(off)
+        count = len(self._offs)
+        head = _INDEX_HEAD.pack(INDEX_MAGIC, self._indexed_size, count, self._mtime or 0, *self._tail)
+        try:
+            if os.path.exists(self.index_path) and count > len(new):
+                # Сначала записи, потом заголовок: после сбоя лишние записи просто не учитываются
+                with open(self.index_path, 'r+b') as f:
+                    f.seek(_INDEX_HEAD.size + (count - len(new)) * _INDEX_REC.size)
+                    f.write(recs.tobytes())
+                    f.seek(0)
+                    f.write(head)
+            else:
+                everything = array('q')
+                for ts, off in zip(self._ts, self._offs):
+                    everything.append(ts)
+                    everything.append(off)
+                with open(self.index_path, 'wb') as f:
+                    f.write(head)
+                    f.write(everything.tobytes())
+        except OSError:
+            # Индекс — только ускоритель: без него всё равно работаем из памяти
+            pass
+
+    # --- Reading ---
+    def _read_rows(self, offsets):
+        rows = []
+        with open(self.path, 'rb') as f:
+            for off in offsets:
+                f.seek(off)
+                rows.append(f.readline().decode('utf-8'))
+        return rows
+
+    def _read_span(self, start, end):
+        return read_span(self.path, start, end)
+
+    def spans(self, rows):
+        """Байтовые диапазоны (start, end) по `rows` строк в порядке файла — для разбиения на части."""
+        self.refresh()
+        offs, n = self._offs, len(self._offs)
+        return [(offs[i], offs[i + rows] if i + rows < n else self._indexed_size)
+                for i in range(0, n, rows)]
+
+    def stream(self, start=0, chunk_rows=8192):
+        """Строки в порядке файла, начиная со строки номер start: (date, hot_curr, ..., total_cost)."""
+        self.refresh()
+        offs, n, end_of_data = self._offs, len(self._offs), self._indexed_size
+        parse = DateParser()
+        for i in range(start, n, chunk_rows):
+            end = offs[i + chunk_rows] if i + chunk_rows < n else end_of_data
+            for row in csv.reader(self._read_span(offs[i], end), delimiter=';'):
+                if row:
+                    yield (parse(row[0]), *map(float, row[1:]))
+
+    def last_reading(self):
+        """Текущие показания [горячая, холодная, электричество] последней записи или None."""
+        self.refresh()
+        if not self._offs:
+            return None
+        row = next(csv.reader(self._read_rows([self._offs[-1]]), delimiter=';'))
+        return [float(row[1]), float(row[2]), float(row[3])]
+
+    def _range(self, since, until):
+        lo = bisect_left(self._keys, (since - _EPOCH).total_seconds()) if since is not None else 0
+        hi = bisect_right(self._keys, (until - _EPOCH).total_seconds()) if until is not None else len(self._keys)
+        return lo, max(lo, hi)
+
+    def _period_lines(self, lo, hi):
+        if self._monotonic:
+            # Строки периода идут в файле подряд — читаем одним куском, но не дальше
+            # проиндексированного: недописанная строка в конце файла в выборку не попадает
+            end = self._order[hi] if hi < len(self._order) else self._indexed_size
+            return self._read_span(self._order[lo], end)
+        return self._read_rows(self._order[lo:hi])
+
+    def query(self, since=None, until=None):
+        """Записи с датой в [since, until] — те же восемь колонок, что и read_history()."""
+        self.refresh()
+        lo, hi = self._range(since, until)
+        if lo >= hi:
+            return _empty_columns()
+
+        cols = _empty_columns()
+        dates, rest = cols[0], cols[1:]
+        parse = DateParser()
+        for row in csv.reader(self._period_lines(lo, hi), delimiter=';'):
+            if not row:
+                continue
+            dates.append(parse(row[0]))
+            for col, value in zip(rest, row[1:]):
+                col.append(float(value))
+        return cols
+
+    def iter_range(self, since=None, until=None, chunk_rows=8192):
+        """Записи с датой в [since, until] по порядку дат, как query(), но по одной —
+        период читается порциями по chunk_rows строк, а не целиком."""
+        self.refresh()
+        lo, hi = self._range(since, until)
+        order, end_of_data, monotonic = self._order, self._indexed_size, self._monotonic
+        parse = DateParser()
+        for i in range(lo, hi, chunk_rows):
+            j = min(i + chunk_rows, hi)
+            if monotonic:
+                lines = self._read_span(order[i], order[j] if j < len(order) else end_of_data)
+            else:
+                lines = self._read_rows(order[i:j])
+            for row in csv.reader(lines, delimiter=';'):
+                if row:
+                    yield (parse(row[0]), *map(float, row[1:]))
+
+    def count(self, since=None, until=None):
+        self.refresh()
+        lo, hi = self._range(since, until)
+        return hi - lo
+
+    def _cost_order(self, lo, hi):
+        # Смещения строк периода, отсортированные по итоговой стоимости; кэш до изменения файла
+        key = (lo, hi, self._indexed_size)
+        if self._cost_cache is None or self._cost_cache[0] != key:
+            costs = [float(line.rsplit(';', 1)[1]) for line in self._period_lines(lo, hi) if line.strip()]
+            self._cost_cache = (key, [off for _, off in sorted(zip(costs, self._order[lo:hi]))])
+        return self._cost_cache[1]
+
+    def page(self, start, count, since=None, until=None, sort='date', descending=False):
+        """Строки [start, start + count) выборки за период в порядке даты или стоимости.
+
+        Читаются только строки страницы: (date, hot_curr, ..., total_cost) кортежами.
+        """
+        self.refresh()
+        lo, hi = self._range(since, until)
+        n = hi - lo
+        start, stop = max(0, start), min(n, start + count)
+        if start >= stop:
+            return []
+        if sort == 'date':
+            base, offsets = lo, self._order
+        else:
+            base, offsets = 0, self._cost_order(lo, hi)
+        picked = [offsets[base + (n - 1 - i if descending else i)] for i in range(start, stop)]
+        parse = DateParser()
+        return [(parse(row[0]), *map(float, row[1:]))
+                for row in csv.reader(self._read_rows(picked), delimiter=';')]
+
+    # --- Writing ---
+    @contextmanager
+    def _locked(self):
+        # Исключительная блокировка CSV (fcntl.flock) на время «дочитать хвост → проверить → дописать»:
+        # другие процессы и потоки пишут по очереди, индекс каждого видит их строки
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+        with open(self.path, 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            self._writing, self._stat = True, None
+            try:
+                self.refresh()
+                f.seek(0, os.SEEK_END)
+                yield f
+            finally:
+                self._writing = False
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def sync(self):
+        """Дождаться записи CSV на диск (когда fsync делается один раз в конце, а не на пачку)."""
+        if os.path.exists(self.path):
+            with open(self.path, 'ab') as f:
+                os.fsync(f.fileno())
+
+    def append(self, row, expect_last=None, fsync=False):
+        """Дописать строку [date, hot_curr, ..., total_cost] в CSV и индекс."""
+        self.extend([row], expect_last, fsync)
+
+    def extend(self, rows, expect_last=None, fsync=False):
+        """Дописать пачку строк одной записью в CSV и одним обновлением индекса.
+
+        expect_last — показания, от которых посчитана первая строка: если последняя запись
+        истории (под блокировкой) другая, ничего не пишется и поднимается ConflictError.
+        fsync=True — дождаться записи на диск.
+        """
+        buf = io.StringIO()
+        writer = csv.writer(buf, delimiter=';')
+        parse = DateParser()
+        new, chunks = [], []
+        for row in rows:
+            date = row[0]
+            if isinstance(date, datetime):
+                row = [date.isoformat(timespec='seconds'), *row[1:]]
+            else:
+                date = parse(str(date))
+            writer.writerow(row)
+            chunks.append(buf.getvalue().encode('utf-8'))
+            buf.seek(0)
+            buf.truncate()
+            new.append(_to_epoch(date))
+        if not new:
+            return
+        data = b''.join(chunks)
+        with self._locked() as f:
+            if expect_last is not None:
+                last = self.last_reading() or _NO_READING
+                if last != [float(v) for v in expect_last]:
+                    raise ConflictError(last, list(expect_last))
+            if f.tell() > self._indexed_size:
+                # под блокировкой хвост без '\n', который не проиндексирован, — не полная строка,
+                # а остаток записи, прерванной сбоем: дописывать за ним нельзя
+                os.ftruncate(f.fileno(), self._indexed_size)
+                f.seek(0, os.SEEK_END)
+            if self._indexed_size:
+                f.seek(self._indexed_size - 1)
+                if f.read(1) != b'\n':
+                    # последняя строка сохранена без перевода строки — новые строки с новой строки
+                    f.write(b'\n')
+                f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                header = io.StringIO()
+                csv.writer(header, delimiter=';').writerow(HEADER)
+                f.write(header.getvalue().encode('utf-8'))
+            offset = f.tell()
+            f.write(data)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+            self._mtime = os.fstat(f.fileno()).st_mtime_ns
+            self._tail = (len(chunks[-1]), zlib.crc32(chunks[-1]))
+            records = []
+            for ts, chunk in zip(new, chunks):
+                records.append((ts, offset))
+                offset += len(chunk)
+            self._add(records)
+            self._indexed_size = offset
+            self._write_index(records)
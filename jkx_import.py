@@ -0,0 +1,190 @@
+import os
+import csv
+import json
+from datetime import datetime
+
+import jkx_core
+from jkx_history import ConflictError, DateParser
+from jkx_tariffs import as_plan
+
+# Потоковый импорт показаний многих квартир из CSV/JSONL.
+# Конвейер из генераторов: read_records → bill_records → write_batches. В памяти только
+# текущая пачка строк и последние показания по каждому счётчику, размер файла не важен.
+
+# Принимаемые имена колонок/ключей → внутренние поля
+FIELD_ALIASES = {
+    'meter': 'meter', 'flat': 'meter', 'apartment': 'meter',
+    'date': 'date',
+    'hot': 'hot', 'hot_curr': 'hot',
+    'cold': 'cold', 'cold_curr': 'cold',
+    'elec': 'elec', 'elec_curr': 'elec',
+}
+
+ERROR_HEADER = ['line', 'meter', 'error', 'record']
+
+# Сколько принятых строк всех счётчиков держать в памяти до записи
+MAX_PENDING_ROWS = 100_000
+
+# Когда ждать записи на диск: никогда (решает ОС), после каждой пачки или один раз в конце
+FSYNC_POLICIES = ('never', 'batch', 'end')
+
+
+def _normalize(raw):
+    return {FIELD_ALIASES[k.strip().lower()]: v for k, v in raw.items()
+            if k is not None and k.strip().lower() in FIELD_ALIASES}
+
+
+# --- Stage 1: чтение ---
+def read_records(path):
+    """(номер строки, исходная запись) из .jsonl или CSV с заголовком (`;` или `,`)."""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    rec = json.loads(line)
+                except ValueError as e:
+                    yield line_no, {'_error': f"Некорректный JSON: {e}", '_raw': line.strip()}
+                    continue
+                yield line_no, rec if isinstance(rec, dict) else {'_error': "Ожидается JSON-объект",
+                                                                  '_raw': line.strip()}
+        else:
+            header = f.readline()
+            delimiter = ';' if header.count(';') >= header.count(',') else ','
+            fields = next(csv.reader([header], delimiter=delimiter))
+            for line_no, row in enumerate(csv.reader(f, delimiter=delimiter), 2):
+                if row:
+                    yield line_no, dict(zip(fields, row))
+
+
+# --- Stage 2: проверка и расчёт ---
+def bill_records(records, coeff=None, prev_lookup=None):
+    """Для каждой записи — ('ok', meter, row, line, prev) или ('error', line, meter, сообщение, запись).
+
+    Проверка та же, что в calculate_utility_cost: показания не меньше предыдущих
+    показаний этого же счётчика (из истории или из предыдущих строк файла).
+    Без coeff каждая строка считается по версии тарифа, действовавшей на её дату.
+    """
+    prev_lookup = prev_lookup or jkx_core.get_last_readings
+    if coeff is None:
+        book = jkx_core.get_tariffs()
+        plan_at = lambda at: book.plan(at=at)
+    else:
+        plan = as_plan(coeff)
+        plan_at = lambda at: plan
+    last = {}
+    parse = DateParser()
+    for line_no, raw in records:
+        meter = None
+        try:
+            if '_error' in raw:
+                raise ValueError(raw['_error'])
+            rec = _normalize(raw)
+            meter = rec.get('meter') or None
+            if meter is not None:
+                meter = str(meter).strip()
+                jkx_core.meter_history_path(meter)
+            try:
+                curr = [float(rec['hot']), float(rec['cold']), float(rec['elec'])]
+            except KeyError as e:
+                raise ValueError(f"Нет поля {e.args[0]}") from None
+            date = rec.get('date')
+            if date:
+                date = str(date).strip()
+                when = parse(date)
+            else:
+                when = None
+                date = datetime.now().isoformat(timespec='seconds')
+
+            prev = last.get(meter)
+            if prev is None:
+                prev = prev_lookup(meter)
+            total, hu, cu, eu, _ = plan_at(when).bill(prev, curr)
+        except ValueError as e:
+            yield 'error', line_no, meter, str(e), raw.get('_raw', raw)
+            continue
+        last[meter] = curr
+        yield 'ok', meter, [date, curr[0], curr[1], curr[2], hu, cu, eu, total], line_no, prev
+
+
+# --- Stage 3: запись пачками ---
+def write_batches(results, errors_path, batch_size=1000, dry_run=False, fsync='never',
+                  max_pending=MAX_PENDING_ROWS):
+    """Дописывает принятые строки в истории пачками, отклонённые — в отчёт об ошибках.
+
+    batch_size — строк одного счётчика на одну запись в его историю; когда всего
+    накоплено max_pending строк, пишутся пачки всех счётчиков (чтобы при тысячах
+    квартир память не росла). Пачка счётчика пишется, только если его история
+    не изменилась с момента чтения предыдущих показаний; иначе строки пачки уходят
+    в отчёт как отклонённые.
+    """
+    if fsync not in FSYNC_POLICIES:
+        raise ValueError(f"fsync: одно из {', '.join(FSYNC_POLICIES)}")
+    stats = {'accepted': 0, 'rejected': 0, 'meters': set()}
+    pending = {}       # meter → (показания до первой строки, строки, номера строк файла)
+    n_pending = 0
+    report = None
+    report_file = None
+
+    def reject(line_no, meter, message, record):
+        nonlocal report, report_file
+        if report is None:
+            report_file = open(errors_path, 'w', newline='', encoding='utf-8')
+            report = csv.writer(report_file, delimiter=';')
+            report.writerow(ERROR_HEADER)
+        report.writerow([line_no, meter or '', message, record])
+        stats['rejected'] += 1
+
+    def write(meter):
+        nonlocal n_pending
+        expect, rows, lines = pending.pop(meter)
+        n_pending -= len(rows)
+        if not dry_run:
+            try:
+                jkx_core.history_store(meter).extend(rows, expect_last=expect, fsync=fsync == 'batch')
+            except ConflictError as e:
+                stats['accepted'] -= len(rows)
+                for line_no, row in zip(lines, rows):
+                    reject(line_no, meter, str(e), ';'.join(map(str, row)))
+                return
+        stats['meters'].add(meter)
+
+    def flush():
+        for meter in list(pending):
+            write(meter)
+
+    try:
+        for res in results:
+            if res[0] == 'ok':
+                _, meter, row, line_no, prev = res
+                batch = pending.get(meter)
+                if batch is None:
+                    batch = pending[meter] = (prev, [], [])
+                batch[1].append(row)
+                batch[2].append(line_no)
+                n_pending += 1
+                stats['accepted'] += 1
+                if len(batch[1]) >= batch_size:
+                    write(meter)
+                elif n_pending >= max_pending:
+                    flush()
+            else:
+                _, line_no, meter, message, raw = res
+                reject(line_no, meter, message, raw if isinstance(raw, str) else json.dumps(raw, ensure_ascii=False))
+        flush()
+    finally:
+        if report_file is not None:
+            report_file.close()
+    if fsync == 'end' and not dry_run:
+        for meter in stats['meters']:
+            jkx_core.history_store(meter).sync()
+    stats['meters'] = len(stats['meters'])
+    return stats
+
+
+def import_readings(path, errors_path=None, batch_size=1000, dry_run=False, coeff=None, fsync='never'):
+    """Импорт файла показаний; возвращает статистику {'accepted', 'rejected', 'meters'}."""
+    errors_path = errors_path or os.path.splitext(path)[0] + '.errors.csv'
+    results = bill_records(read_records(path), coeff)
+    return write_batches(results, errors_path, batch_size, dry_run, fsync)
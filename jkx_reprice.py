@@ -0,0 +1,106 @@
+import os
+import csv
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import jkx_core
+from jkx_history import DateParser, read_span
+from jkx_tariffs import TariffBook, as_plan, compile_plan, load_tariffs
+
+# Пересчёт всей истории по другому набору тарифов («что было бы, если»).
+# История режется на части по байтовым диапазонам индекса; каждая часть считается
+# независимо (в процессе-воркере или в текущем процессе) одной и той же функцией,
+# поэтому параллельный и последовательный пути дают одинаковый результат.
+# Тарифы компилируются один раз и передаются в части готовым TariffPlan (или TariffBook,
+# если у тарифов есть версии по датам — тогда каждая строка считается по своей версии).
+
+OUTPUT_HEADER = [
+    'meter', 'date', 'hot_usage', 'cold_usage', 'elec_usage',
+    'old_total', 'total_cost', 'delta',
+    'hot_total_cost', 'hot_water_component_cost', 'thermal_component_cost',
+    'cold_cost', 'sewage_cost', 'electricity_cost',
+]
+_BREAKDOWN_KEYS = OUTPUT_HEADER[8:]
+
+SHARD_ROWS = 20_000           # строк истории в одной части
+SEQUENTIAL_MAX_ROWS = 50_000  # меньше — считаем без пула процессов
+
+
+def load_plans(path):
+    """Тарифы из JSON, уже проверенные: TariffBook при наличии tariff_plans, иначе TariffPlan."""
+    data = jkx_core.load_config(path)
+    if 'tariff_plans' in data:
+        return load_tariffs(data)
+    return compile_plan(data.get('coefficients', data))
+
+
+def _reprice_shard(shard):
+    meter, path, start, end, tariffs = shard
+    if isinstance(tariffs, TariffBook):
+        parse = DateParser()
+        plan_at = lambda d: tariffs.plan(at=parse(d))
+    else:
+        plan_at = lambda d: tariffs
+    out = []
+    for row in csv.reader(read_span(path, start, end), delimiter=';'):
+        if not row:
+            continue
+        # Расход берём как есть — то же, что calculate_utility_cost с prev = 0
+        old_total = float(row[7])
+        total, hu, cu, eu, breakdown = plan_at(row[0]).bill_usage(float(row[4]), float(row[5]), float(row[6]))
+        out.append([meter or '', row[0], hu, cu, eu, old_total, total, total - old_total]
+                   + [breakdown.get(k, '') for k in _BREAKDOWN_KEYS])
+    return out
+
+
+def _shards(tariffs, meters, shard_rows):
+    shards, rows = [], 0
+    for meter in meters:
+        store = jkx_core.history_store(meter)
+        rows += len(store)
+        shards.extend((meter, store.path, start, end, tariffs) for start, end in store.spans(shard_rows))
+    return shards, rows
+
+
+def _ordered(executor, shards, window):
+    # Как executor.map, но вперёд отправляется не больше window частей —
+    # готовые результаты не копятся в памяти, пока пишется вывод
+    pending = deque()
+    for shard in shards:
+        pending.append(executor.submit(_reprice_shard, shard))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def reprice_history(coeff, output_path, meters=None, workers=None, shard_rows=SHARD_ROWS, parallel=None):
+    """Пересчитать историю с тарифами coeff (словарь, TariffPlan или TariffBook) и записать построчный результат в output_path (CSV `;`).
+
+    meters — список счётчиков (None в списке — основная история); по умолчанию все.
+    parallel=None выбирает пул процессов автоматически по объёму истории.
+    Возвращает число пересчитанных строк.
+    """
+    if meters is None:
+        meters = ([None] if os.path.exists(jkx_core.HISTORY_FILE) else []) + jkx_core.list_meters()
+    tariffs = coeff if isinstance(coeff, TariffBook) else as_plan(coeff)
+    shards, rows = _shards(tariffs, meters, shard_rows)
+    if parallel is None:
+        parallel = rows > SEQUENTIAL_MAX_ROWS and len(shards) > 1 and workers != 1
+
+    written = 0
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(OUTPUT_HEADER)
+        if parallel:
+            workers = workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for part in _ordered(executor, shards, workers * 2):
+                    writer.writerows(part)
+                    written += len(part)
+        else:
+            for shard in shards:
+                part = _reprice_shard(shard)
+                writer.writerows(part)
+                written += len(part)
+    return written
@@ -0,0 +1,335 @@
+import json
+import asyncio
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+import jkx_core
+from jkx_batch import calculate_utility_cost_batch
+from jkx_history import ConflictError
+
+# Локальный HTTP-сервис расчёта (asyncio, только стандартная библиотека).
+# Тарифы и последние показания счётчиков держатся в памяти; все обращения к файлам
+# истории идут через один поток, поэтому HistoryStore не используется из двух потоков сразу.
+# Последние показания из памяти сверяются с версией файла истории: если его дописал другой
+# процесс (окно, jkx-calc calc, импорт), они перечитываются. Записи в историю от одновременных
+# запросов собираются в пачку и пишутся одним extend() на счётчик — с проверкой, что историю
+# за это время не дописал другой процесс (иначе 409). Запрос с сохранением и своим prev
+# принимается, только если prev совпадает с последними показаниями (с учётом очереди).
+#
+#   POST /calculate        {"curr": [h, c, e], "prev"?, "meter"?, "plan"?, "save"?: true}
+#   POST /batch-calculate  {"prev": [[h, c, e], ...], "curr": [[h, c, e], ...], "plan"?}
+#   GET  /history?meter=&since=&until=&offset=&limit=
+#   GET  /last-reading?meter=
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+FLUSH_INTERVAL = 0.005      # сколько ждать попутчиков перед записью пачки, с
+HISTORY_LIMIT = 100
+HISTORY_MAX_LIMIT = 10_000
+MAX_BODY = 16 * 2**20
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _readings(body, key):
+    try:
+        values = [float(v) for v in body[key]]
+    except KeyError:
+        raise ValueError(f"Нет поля {key}") from None
+    except (TypeError, ValueError):
+        raise ValueError(f"{key}: ожидаются числа") from None
+    if len(values) != 3:
+        raise ValueError(f"{key}: нужно три показания (горячая, холодная, электричество)")
+    return values
+
+
+def _meter(value):
+    if value in (None, '', '-'):
+        return None
+    meter = str(value).strip()
+    jkx_core.meter_history_path(meter)   # проверка имени
+    return meter
+
+
+def _date_param(params, key):
+    value = params.get(key)
+    return jkx_core._parse_date(value) if value else None
+
+
+def _int_param(params, key, default, maximum=None):
+    try:
+        value = int(params.get(key, default))
+    except ValueError:
+        raise ValueError(f"{key} должен быть целым числом") from None
+    if value < 0:
+        raise ValueError(f"{key} не может быть отрицательным")
+    return min(value, maximum) if maximum is not None else value
+
+
+def _column(values):
+    return values.tolist() if hasattr(values, 'tolist') else list(values)
+
+
+def _response(status, payload, keep_alive):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+
+class BillingService:
+    """Обработчики запросов и общее состояние: индекс последних показаний и очередь записи."""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, fsync=False):
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix='jkx-history')
+        self._last = {}       # meter → последние показания, включая ещё не записанные
+        self._seen = {}       # meter → версия файла истории, с которой сверены _last
+        self._pending = {}    # meter → (показания до пачки, строки, future записи)
+        self._writing = {}    # meter → сколько пачек сейчас пишется
+        self._commit = None   # задача записи текущей пачки
+        self._routes = {
+            '/calculate': ('POST', self.calculate),
+            '/batch-calculate': ('POST', self.batch_calculate),
+            '/history': ('GET', self.history),
+            '/last-reading': ('GET', self.last_reading),
+        }
+
+    def _in_io(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self._io, fn, *args)
+
+    def _queued(self, meter):
+        return meter in self._pending or meter in self._writing
+
+    @staticmethod
+    def _file_last(meter, seen):
+        # в потоке записи: версия файла и его последние показания, если версия не seen
+        store = jkx_core.history_store(meter)
+        version = store.version
+        if version == seen:
+            return version, None
+        return version, store.last_reading() or [0.0, 0.0, 0.0]
+
+    async def _last_reading(self, meter):
+        """Последние показания счётчика с учётом строк в очереди и чужих записей в файл."""
+        while True:
+            if self._queued(meter) and meter in self._last:
+                return self._last[meter]
+            seen = self._seen.get(meter) if meter in self._last else None
+            version, loaded = await self._in_io(self._file_last, meter, seen)
+            if self._queued(meter) and meter in self._last:
+                continue  # пока читали, другой запрос поставил строки в очередь
+            if loaded is not None:
+                self._last[meter] = loaded
+            self._seen[meter] = version
+            return self._last[meter]
+
+    # --- Group commit ---
+    async def _append(self, meter, prev, row):
+        batch = self._pending.get(meter)
+        if batch is None:
+            batch = self._pending[meter] = (prev, [], asyncio.get_running_loop().create_future())
+        batch[1].append(row)
+        if self._commit is None:
+            self._commit = asyncio.ensure_future(self._group_commit())
+        await asyncio.shield(batch[2])
+
+    async def _group_commit(self):
+        await asyncio.sleep(self.flush_interval)
+        pending, self._pending, self._commit = self._pending, {}, None
+        for meter in pending:
+            self._writing[meter] = self._writing.get(meter, 0) + 1
+        try:
+            versions = await self._in_io(self._write, pending, self.fsync)
+        except Exception as e:
+            versions = dict.fromkeys(pending, e)
+        for meter, (_, _, done) in pending.items():
+            if self._writing[meter] > 1:
+                self._writing[meter] -= 1
+            else:
+                del self._writing[meter]
+            result = versions[meter]
+            if not isinstance(result, Exception):
+                # файл догнал показания в памяти (они могут быть и новее — из следующей пачки)
+                self._seen[meter] = result
+                done.set_result(None)
+                continue
+            # в памяти показания ушли вперёд файла — перечитаем их из истории, когда
+            # по счётчику не останется строк в очереди (их пачки тоже не совпадут с файлом)
+            if not self._queued(meter):
+                self._last.pop(meter, None)
+                self._seen.pop(meter, None)
+            done.set_exception(result)
+
+    @staticmethod
+    def _write(pending, fsync):
+        # meter → версия файла после записи или исключение
+        versions = {}
+        for meter, (expect, rows, _) in pending.items():
+            try:
+                store = jkx_core.history_store(meter)
+                store.extend(rows, expect_last=expect, fsync=fsync)
+                versions[meter] = store.version
+            except Exception as e:
+                versions[meter] = e
+        return versions
+
+    async def drain(self):
+        """Дождаться записи всех принятых строк."""
+        while self._commit is not None:
+            await asyncio.shield(self._commit)
+
+    def close(self):
+        self._io.shutdown(wait=True)
+
+    # --- Handlers ---
+    async def calculate(self, body, params):
+        curr = _readings(body, 'curr')
+        meter = _meter(body.get('meter'))
+        plan = jkx_core.get_plan(body.get('plan', jkx_core.DEFAULT_PLAN))
+        save = body.get('save')
+        prev = _readings(body, 'prev') if 'prev' in body else None
+        if save or prev is None:
+            last = await self._last_reading(meter)
+            # от чтения last до постановки строки в очередь нет await — запросы к одному счётчику не перемешиваются
+            if prev is None:
+                prev = last
+            elif save and prev != last:
+                raise ConflictError(last, prev)
+        total, hu, cu, eu, breakdown = plan.bill(prev, curr)
+        result = {'meter': meter, 'prev': prev, 'curr': curr, 'usage': [hu, cu, eu], 'breakdown': breakdown}
+        if save:
+            if hu == 0 and cu == 0 and eu == 0:
+                raise ValueError("Показания совпадают с предыдущими — нет изменений.")
+            row = [datetime.now().isoformat(timespec='seconds'), *curr, hu, cu, eu, total]
+            self._last[meter] = curr
+            await self._append(meter, prev, row)
+            result['saved'] = row[0]
+        return result
+
+    async def batch_calculate(self, body, params):
+        try:
+            prev, curr = body['prev'], body['curr']
+        except KeyError as e:
+            raise ValueError(f"Нет поля {e.args[0]}") from None
+        plan = jkx_core.get_plan(body.get('plan', jkx_core.DEFAULT_PLAN))
+        # большой пакет считается вне цикла событий, чтобы не задерживать остальные запросы
+        loop = asyncio.get_running_loop()
+        total, hot, cold, elec, breakdown = await loop.run_in_executor(
+            None, calculate_utility_cost_batch, prev, curr, plan)
+        return {'usage': {'hot': _column(hot), 'cold': _column(cold), 'elec': _column(elec)},
+                'breakdown': {k: _column(v) if not isinstance(v, float) else v for k, v in breakdown.items()}}
+
+    async def history(self, body, params):
+        meter = _meter(params.get('meter'))
+        since, until = _date_param(params, 'since'), _date_param(params, 'until')
+        offset = _int_param(params, 'offset', 0)
+        limit = _int_param(params, 'limit', HISTORY_LIMIT, HISTORY_MAX_LIMIT)
+
+        def query():
+            store = jkx_core.history_store(meter)
+            return store.count(since, until), store.page(offset, limit, since, until, descending=True)
+
+        total, rows = await self._in_io(query)
+        return {'meter': meter, 'count': total, 'offset': offset,
+                'rows': [[r[0].isoformat(), *r[1:]] for r in rows]}
+
+    async def last_reading(self, body, params):
+        meter = _meter(params.get('meter'))
+        return {'meter': meter, 'last': await self._last_reading(meter)}
+
+    # --- HTTP ---
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        route = self._routes.get(url.path)
+        if route is None:
+            raise HttpError(404, f"Нет такого адреса: {url.path}")
+        allowed, handler = route
+        if method != allowed:
+            raise HttpError(405, f"{url.path}: только {allowed}")
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if body:
+            try:
+                body = json.loads(body)
+            except ValueError:
+                raise HttpError(400, "Тело запроса — не JSON") from None
+            if not isinstance(body, dict):
+                raise HttpError(400, "Тело запроса должно быть объектом JSON")
+        return await handler(body or {}, params)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = h.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                try:
+                    method, target, version = line.decode('latin-1').split()
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    writer.write(_response(400, {'error': "Некорректный запрос"}, False))
+                    break
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                if length > MAX_BODY:
+                    writer.write(_response(413, {'error': "Слишком большой запрос"}, False))
+                    break
+                body = await reader.readexactly(length) if length else b''
+                try:
+                    status, payload = 200, await self.dispatch(method, target, body)
+                except HttpError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except ConflictError as e:
+                    status, payload = 409, {'error': str(e), 'last': e.last}
+                except ValueError as e:
+                    status, payload = 400, {'error': str(e)}
+                except Exception as e:
+                    status, payload = 500, {'error': f"{type(e).__name__}: {e}"}
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def start(host=DEFAULT_HOST, port=DEFAULT_PORT, flush_interval=FLUSH_INTERVAL, fsync=False):
+    """Запустить сервис; возвращает (service, asyncio.Server)."""
+    service = BillingService(flush_interval, fsync)
+    server = await asyncio.start_server(service.handle, host, port)
+    return service, server
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, flush_interval=FLUSH_INTERVAL, fsync=False):
+    jkx_core.init_files()
+    jkx_core.get_plan()   # тарифы проверяются и компилируются до первого запроса
+    jkx_core.add_config_listener(
+        lambda old, new: print("config.json перечитан, тарифы обновлены", flush=True))
+    service, server = await start(host, port, flush_interval, fsync)
+    addr = server.sockets[0].getsockname()
+    print(f"Сервис расчёта: http://{addr[0]}:{addr[1]}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.drain()
+        service.close()
@@ -0,0 +1,234 @@
+import math
+from collections import deque
+
+import jkx_core
+
+# Накопительная статистика по истории счётчика и предупреждения о странных показаниях.
+# Каждая строка истории учитывается один раз и за O(1): MeterStats хранит только суммы,
+# средние и дисперсии (метод Уэлфорда) и суммы по месяцам. При дописывании истории
+# HistoryStats дочитывает лишь новые строки, а не пересчитывает read_history() целиком.
+
+RESOURCES = ('hot', 'cold', 'elec')
+RESOURCE_TITLES = {'hot': "горячая вода", 'cold': "холодная вода", 'elec': "электричество"}
+RESOURCE_UNITS = {'hot': "м³", 'cold': "м³", 'elec': "кВт·ч"}
+
+MIN_INTERVAL_DAYS = 1.0   # интервалы короче — не для оценки расхода в день
+SPIKE_MIN_SAMPLES = 6     # сколько интервалов нужно, прежде чем искать всплески
+SPIKE_SIGMA = 3.0         # всплеск: расход в день выше среднего на SPIKE_SIGMA σ ...
+SPIKE_RATIO = 2.0         # ... и хотя бы в SPIKE_RATIO раза
+MAX_ALERTS = 100
+
+
+class Alert:
+    __slots__ = ('date', 'kind', 'resource', 'message')
+
+    def __init__(self, date, kind, resource, message):
+        self.date = date
+        self.kind = kind            # 'spike' или 'rollback'
+        self.resource = resource
+        self.message = message
+
+    def __repr__(self):
+        return f"<Alert {self.kind} {self.resource} {self.date:%Y-%m-%d}>"
+
+    def as_dict(self):
+        return {'date': self.date.isoformat(), 'kind': self.kind,
+                'resource': self.resource, 'message': self.message}
+
+
+class _Running:
+    """Среднее и дисперсия потока чисел за O(1) на значение (Уэлфорд)."""
+
+    __slots__ = ('n', 'mean', 'm2')
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x):
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+
+class MeterStats:
+    """Статистика одного счётчика по строкам истории в порядке записи."""
+
+    def __init__(self):
+        self.rows = 0
+        self.first = None
+        self.last = None
+        self.days = 0.0                     # сумма интервалов между показаниями, дни
+        self.usage = [0.0, 0.0, 0.0]        # расход за эти интервалы
+        self.cost = 0.0                     # и его стоимость
+        self.last_cost_per_day = None
+        self.rates = [_Running() for _ in RESOURCES]
+        self.months = {}                    # (год, месяц) → [горячая, холодная, электричество, ₽]
+        self.alerts = deque(maxlen=MAX_ALERTS)
+        self._prev = None                   # текущие показания предыдущей строки
+
+    def update(self, row):
+        """Учесть строку (date, hot_curr, cold_curr, elec_curr, hot_u, cold_u, elec_u, total)."""
+        date, curr, usage, total = row[0], row[1:4], row[4:7], row[7]
+        self.rows += 1
+        month = self.months.get((date.year, date.month))
+        if month is None:
+            month = self.months[(date.year, date.month)] = [0.0, 0.0, 0.0, 0.0]
+        for i in range(3):
+            month[i] += usage[i]
+        month[3] += total
+
+        if self._prev is not None:
+            for i, res in enumerate(RESOURCES):
+                if curr[i] < self._prev[i]:
+                    self._alert(date, 'rollback', res,
+                                f"{RESOURCE_TITLES[res]}: показания уменьшились "
+                                f"({self._prev[i]} → {curr[i]}) — замена или сброс счётчика?")
+        if self.last is not None:
+            days = (date - self.last).total_seconds() / 86400
+            if days > 0:
+                self._interval(date, days, usage, total)
+        else:
+            self.first = date
+        if self.last is None or date > self.last:
+            self.last = date
+        self._prev = curr
+
+    def _interval(self, date, days, usage, total):
+        # Расход строки — за время с предыдущих показаний; интервалы бывают любой длины
+        self.days += days
+        self.cost += total
+        self.last_cost_per_day = total / days
+        for i, res in enumerate(RESOURCES):
+            self.usage[i] += usage[i]
+            if days < MIN_INTERVAL_DAYS:
+                continue
+            rate, running = usage[i] / days, self.rates[i]
+            if (running.n >= SPIKE_MIN_SAMPLES and rate > running.mean * SPIKE_RATIO
+                    and rate > running.mean + SPIKE_SIGMA * running.std):
+                self._alert(date, 'spike', res,
+                            f"{RESOURCE_TITLES[res]}: {rate:.3f} {RESOURCE_UNITS[res]}/день "
+                            f"при среднем {running.mean:.3f}")
+            running.add(rate)
+
+    def _alert(self, date, kind, resource, message):
+        self.alerts.append(Alert(date, kind, resource, message))
+
+    # --- Results ---
+    @property
+    def avg_daily(self):
+        """Средний расход в день [горячая, холодная, электричество] или None (мало данных)."""
+        if not self.days:
+            return None
+        return [u / self.days for u in self.usage]
+
+    @property
+    def cost_per_day(self):
+        return self.cost / self.days if self.days else None
+
+    def month_over_month(self):
+        """(последний месяц с данными, предыдущий календарный месяц, разница [г, х, э, ₽]) или None.
+
+        Если за предыдущий месяц записей нет, разница — None (сравнивать не с чем).
+        """
+        if not self.months:
+            return None
+        key = max(self.months)
+        year, month = key
+        prev_key = (year, month - 1) if month > 1 else (year - 1, 12)
+        prev = self.months.get(prev_key)
+        if prev is None:
+            return key, prev_key, None
+        return key, prev_key, [a - b for a, b in zip(self.months[key], prev)]
+
+    def summary(self):
+        mom = self.month_over_month()
+        return {
+            'rows': self.rows,
+            'first': self.first.isoformat() if self.first else None,
+            'last': self.last.isoformat() if self.last else None,
+            'days': self.days,
+            'avg_daily': dict(zip(RESOURCES, self.avg_daily)) if self.days else None,
+            'cost_per_day': self.cost_per_day,
+            'last_cost_per_day': self.last_cost_per_day,
+            'month_over_month': None if mom is None else {
+                'month': "%04d-%02d" % mom[0], 'previous': "%04d-%02d" % mom[1],
+                'delta': dict(zip(RESOURCES + ('cost',), mom[2])) if mom[2] is not None else None},
+            'alerts': [a.as_dict() for a in self.alerts],
+        }
+
+
+class HistoryStats:
+    """MeterStats, привязанная к файлу истории: refresh() учитывает только новые строки."""
+
+    def __init__(self, store):
+        self.store = store
+        self.stats = MeterStats()
+        self._position = 0        # строк файла уже учтено
+        self._generation = store.generation
+        self._version = None
+
+    def refresh(self):
+        version = self.store.version
+        if version == self._version:
+            return self.stats
+        if self.store.generation != self._generation:
+            # файл перезаписан (а не дописан) — считаем заново
+            self.stats, self._position = MeterStats(), 0
+            self._generation = self.store.generation
+        update = self.stats.update
+        for row in self.store.stream(self._position):
+            update(row)
+            self._position += 1
+        self._version = version
+        return self.stats
+
+
+_trackers = {}
+
+
+def history_stats(meter=None):
+    """Актуальная MeterStats счётчика (None — основная история)."""
+    store = jkx_core.history_store(meter)
+    tracker = _trackers.get(store.path)
+    if tracker is None or tracker.store is not store:
+        tracker = _trackers[store.path] = HistoryStats(store)
+    return tracker.refresh()
+
+
+def _fmt_delta(v):
+    return f"{v:+.2f}"
+
+
+def format_stats(stats, alerts=5):
+    """Строки сводки для вкладки «История» и jkx-calc stats."""
+    if not stats.rows:
+        return ["История пуста."]
+    lines = [f"Записей: {stats.rows}, с {stats.first:%d.%m.%Y} по {stats.last:%d.%m.%Y}"]
+    avg = stats.avg_daily
+    if avg is None:
+        lines.append("Средний расход: нужно хотя бы два показания в разные дни.")
+    else:
+        lines.append("В среднем в день: " + ", ".join(
+            f"{RESOURCE_TITLES[r]} {v:.3f} {RESOURCE_UNITS[r]}" for r, v in zip(RESOURCES, avg))
+            + f"; {stats.cost_per_day:.2f} ₽ (последний интервал — {stats.last_cost_per_day:.2f} ₽/день)")
+    mom = stats.month_over_month()
+    if mom is not None:
+        (y, m), (py, pm), delta = mom
+        if delta is None:
+            lines.append(f"{m:02d}.{y} к {pm:02d}.{py}: за {pm:02d}.{py} записей нет.")
+        else:
+            lines.append(f"{m:02d}.{y} к {pm:02d}.{py}: " + ", ".join(
+                f"{RESOURCE_TITLES[r]} {_fmt_delta(v)} {RESOURCE_UNITS[r]}" for r, v in zip(RESOURCES, delta))
+                + f"; {_fmt_delta(delta[3])} ₽")
+    recent = list(stats.alerts)[-alerts:]
+    if recent:
+        lines.append(f"Предупреждения ({len(stats.alerts)}):")
+        lines.extend(f"  {a.date:%d.%m.%Y} — {a.message}" for a in reversed(recent))
+    return lines
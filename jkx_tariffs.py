@@ -0,0 +1,191 @@
+from bisect import bisect_right
+from datetime import datetime
+
+from jkx_history import _parse_date
+
+# Тарифы, проверенные и «скомпилированные» один раз при загрузке config.json.
+#
+# TariffPlan — неизменяемый план с готовыми ставками: при расчёте нет ни поиска ключей
+# в словаре, ни float(), ни выбора формулы. TariffBook — именованные планы с версиями
+# по датам вступления в силу, чтобы старые строки истории считались по тарифу своего времени:
+#
+#   "coefficients": {...},                       ← базовая версия плана "default"
+#   "tariff_plans": {
+#     "default": [{"effective_from": "2025-07-01", "coefficients": {...}}],
+#     "social":  [{"coefficients": {...}}]
+#   }
+
+RECEIPT_KEYS = ('thermal_conversion', 'thermal_tariff_gcal', 'hot_water_table_component')
+DEFAULT_PLAN = 'default'
+
+
+def _rate(coeff, key, default=None):
+    value = coeff.get(key, default)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Тариф {key} должен быть числом, а не {value!r}") from None
+
+
+class TariffPlan:
+    """Неизменяемый набор ставок одного плана. bill() считает так же, как calculate_utility_cost."""
+
+    __slots__ = ('name', 'effective_from', 'receipt',
+                 'table_comp', 'thermal_conv', 'thermal_tariff', 'thermal_unit',
+                 'hot_rate', 'hot_water', 'cold_rate', 'sewage_rate', 'elec_rate')
+
+    def __init__(self, coeff, name=DEFAULT_PLAN, effective_from=None):
+        set_ = object.__setattr__
+        set_(self, 'name', name)
+        set_(self, 'effective_from', effective_from)
+        receipt = all(k in coeff for k in RECEIPT_KEYS)
+        set_(self, 'receipt', receipt)
+        # hot_water показывается в тексте результата даже при формуле по квитанции
+        set_(self, 'hot_water', _rate(coeff, 'hot_water') if 'hot_water' in coeff else None)
+        if receipt:
+            table_comp = _rate(coeff, 'hot_water_table_component')
+            thermal_conv = _rate(coeff, 'thermal_conversion')
+            thermal_tariff = _rate(coeff, 'thermal_tariff_gcal')
+            set_(self, 'table_comp', table_comp)
+            set_(self, 'thermal_conv', thermal_conv)
+            set_(self, 'thermal_tariff', thermal_tariff)
+            set_(self, 'thermal_unit', thermal_conv * thermal_tariff)
+            set_(self, 'hot_rate', table_comp + thermal_conv * thermal_tariff)
+        elif self.hot_water is not None:
+            for key in ('table_comp', 'thermal_conv', 'thermal_tariff', 'thermal_unit'):
+                set_(self, key, None)
+            set_(self, 'hot_rate', self.hot_water)
+        else:
+            raise ValueError("В config отсутствуют поля для расчёта горячей воды. "
+                             "Нужны либо thermal_conversion + thermal_tariff_gcal + hot_water_table_component, "
+                             "либо hot_water в coefficients.")
+        set_(self, 'cold_rate', _rate(coeff, 'cold_water', 0.0))
+        set_(self, 'sewage_rate', _rate(coeff, 'sewage', 0.0))
+        set_(self, 'elec_rate', _rate(coeff, 'electricity', 0.0))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("TariffPlan неизменяем")
+
+    def __reduce__(self):
+        # для передачи в процессы-воркеры (jkx_reprice)
+        return (_restore_plan, (self.name, self.effective_from,
+                                tuple(getattr(self, k) for k in self.__slots__[2:])))
+
+    def __repr__(self):
+        since = f", с {self.effective_from.date()}" if self.effective_from else ""
+        return f"<TariffPlan {self.name}{since}: {self.hot_rate} ₽/м³ горячей>"
+
+    def bill(self, prev, curr):
+        """То же, что calculate_utility_cost(prev, curr): (total, hot, cold, elec, breakdown)."""
+        if any(c < p for c, p in zip(curr, prev)):
+            raise ValueError("Показания не могут быть меньше предыдущих!")
+        return self.bill_usage(curr[0] - prev[0], curr[1] - prev[1], curr[2] - prev[2])
+
+    def bill_usage(self, hot, cold, elec):
+        # Порядок операций тот же, что в исходной формуле, — результат совпадает побитно
+        if self.receipt:
+            water = hot * self.table_comp
+            thermal = hot * self.thermal_conv * self.thermal_tariff
+            hot_total_cost = water + thermal
+            breakdown = {
+                'hot_water_component_unit': self.table_comp,
+                'thermal_component_unit': self.thermal_unit,
+                'thermal_conv': self.thermal_conv,
+                'thermal_tariff_gcal': self.thermal_tariff,
+                'hot_water_component_cost': water,
+                'thermal_component_cost': thermal,
+                'hot_total_cost': hot_total_cost,
+            }
+        else:
+            hot_total_cost = hot * self.hot_water
+            breakdown = {'hot_total_cost': hot_total_cost}
+        cold_cost = cold * self.cold_rate
+        sewage_cost = (hot + cold) * self.sewage_rate
+        elec_cost = elec * self.elec_rate
+        total_cost = hot_total_cost + cold_cost + sewage_cost + elec_cost
+        breakdown['cold_cost'] = cold_cost
+        breakdown['sewage_cost'] = sewage_cost
+        breakdown['electricity_cost'] = elec_cost
+        breakdown['total_cost'] = total_cost
+        return total_cost, hot, cold, elec, breakdown
+
+
+def _restore_plan(name, effective_from, values):
+    plan = object.__new__(TariffPlan)
+    object.__setattr__(plan, 'name', name)
+    object.__setattr__(plan, 'effective_from', effective_from)
+    for key, value in zip(TariffPlan.__slots__[2:], values):
+        object.__setattr__(plan, key, value)
+    return plan
+
+
+def compile_plan(coeff, name=DEFAULT_PLAN, effective_from=None):
+    if not isinstance(coeff, dict):
+        raise ValueError(f"coefficients должен быть объектом JSON, а не {type(coeff).__name__}")
+    return TariffPlan(coeff, name, effective_from)
+
+
+def as_plan(coeff):
+    """TariffPlan как есть, словарь coefficients — компилируется."""
+    if isinstance(coeff, TariffPlan):
+        return coeff
+    return compile_plan(coeff)
+
+
+class TariffBook:
+    """Именованные планы, у каждого — версии, отсортированные по дате вступления в силу."""
+
+    __slots__ = ('_versions', '_dates')
+
+    def __init__(self, plans):
+        self._versions = {}
+        self._dates = {}
+        for name, versions in plans.items():
+            versions = sorted(versions, key=lambda p: p.effective_from or datetime.min)
+            self._versions[name] = versions
+            self._dates[name] = [p.effective_from or datetime.min for p in versions]
+
+    @property
+    def names(self):
+        return list(self._versions)
+
+    def plan(self, name=DEFAULT_PLAN, at=None):
+        """Версия плана name, действующая на дату at (по умолчанию — сейчас)."""
+        try:
+            dates = self._dates[name]
+        except KeyError:
+            raise ValueError(f"Нет тарифного плана {name!r}") from None
+        at = at or datetime.now()
+        i = bisect_right(dates, at) - 1
+        if i < 0:
+            raise ValueError(f"План {name!r} не действовал на {at:%Y-%m-%d}")
+        return self._versions[name][i]
+
+
+def load_tariffs(config):
+    """Проверить тарифы config.json и собрать TariffBook (ошибки — ValueError)."""
+    if not isinstance(config, dict):
+        raise ValueError("config.json должен быть объектом JSON")
+    plans = {}
+    if 'coefficients' in config:
+        plans[DEFAULT_PLAN] = [compile_plan(config['coefficients'])]
+    tariff_plans = config.get('tariff_plans', {})
+    if not isinstance(tariff_plans, dict):
+        raise ValueError("tariff_plans должен быть объектом JSON")
+    for name, versions in tariff_plans.items():
+        if isinstance(versions, dict):
+            versions = [versions]
+        elif not isinstance(versions, list):
+            raise ValueError(f"tariff_plans.{name}: ожидается версия плана или список версий")
+        for v in versions:
+            if not isinstance(v, dict):
+                raise ValueError(f"tariff_plans.{name}: версия плана должна быть объектом JSON")
+            since = v.get('effective_from')
+            if since is not None and not isinstance(since, str):
+                raise ValueError(f"tariff_plans.{name}: effective_from должна быть строкой с датой, "
+                                 f"а не {since!r}")
+            since = _parse_date(since) if since else None
+            plans.setdefault(name, []).append(compile_plan(v.get('coefficients', {}), name, since))
+    if not plans:
+        raise ValueError("В config нет ни coefficients, ни tariff_plans.")
+    return TariffBook(plans)
@@ -13,11 +13,19 @@ setup(
     license='MIT',
     url='https://github.com/MrAsavik/jkx_calculator.git',  # ваш репозиторий
     packages=find_packages(exclude=('tests',)),
+    py_modules=['jkx_core', 'jkx_history', 'jkx_columnar', 'jkx_tariffs', 'jkx_batch', 'jkx_cli', 'jkx_import', 'jkx_reprice', 'jkx_service', 'jkx_aggregate', 'jkx_stats', 'jkx_export', 'jkx_calculator'],
     install_requires=[
         "customtkinter",
         "matplotlib",
         "ttkwidgets"
     ],
+    extras_require={
+        "fast": ["numpy"],
+    },
+    entry_points={
+        "console_scripts": ["jkx-calc=jkx_cli:main"],
+        "gui_scripts": ["jkx-calculator=jkx_calculator:main"],
+    },
     python_requires='>=3.7',
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+import jkx_batch
+from jkx_core import calculate_utility_cost
+
+# Пакетный расчёт совпадает со скалярным calculate_utility_cost до бита — и через numpy,
+# и на колонках array('d') без него; неправильная форма входа — ValueError.
+
+RECEIPT = {'hot_water_table_component': 41.34, 'thermal_conversion': 0.0665, 'thermal_tariff_gcal': 2556.3,
+           'cold_water': 42.3, 'sewage': 36.71, 'electricity': 6.57}
+HOT_WATER = {'hot_water': 211.44, 'cold_water': 42.3, 'sewage': 36.71, 'electricity': 6.57}
+
+PATHS = ['python']
+if jkx_batch.np is not None:
+    PATHS.insert(0, 'numpy')
+
+
+@pytest.fixture(params=PATHS)
+def batch(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(jkx_batch, 'np', None)
+    return jkx_batch.calculate_utility_cost_batch
+
+
+def _readings(n=500, seed=7):
+    rnd = random.Random(seed)
+    prev = [[rnd.uniform(0, 500), rnd.uniform(0, 800), rnd.uniform(0, 20000)] for _ in range(n)]
+    curr = [[p[0] + rnd.uniform(0, 10), p[1] + rnd.uniform(0, 15), p[2] + rnd.uniform(0, 400)] for p in prev]
+    return prev, curr
+
+
+@pytest.mark.parametrize('coeff', [RECEIPT, HOT_WATER], ids=['receipt', 'hot_water'])
+def test_batch_matches_scalar_bit_for_bit(batch, coeff):
+    prev, curr = _readings()
+    totals, hot, cold, elec, breakdown = batch(prev, curr, coeff)
+    for i, (p, c) in enumerate(zip(prev, curr)):
+        total, hu, cu, eu, expected = calculate_utility_cost(p, c, coeff)
+        assert (float(totals[i]), float(hot[i]), float(cold[i]), float(elec[i])) == (total, hu, cu, eu)
+        for key, value in expected.items():
+            got = breakdown[key]
+            assert float(got if isinstance(got, float) else got[i]) == value, key
+
+
+@pytest.mark.parametrize('prev, curr', [
+    ([1, 2, 3, 4, 5, 6], [1, 2, 3, 4, 5, 6]),
+    ([[1, 2]], [[1, 2]]),
+    ([[1, 2, 3, 4]], [[1, 2, 3, 4]]),
+    ([[1, 2, 3]], [[1, 2, 3], [4, 5, 6]]),
+], ids=['flat', 'two-columns', 'four-columns', 'length-mismatch'])
+def test_badly_shaped_input_is_rejected(batch, prev, curr):
+    with pytest.raises(ValueError):
+        batch(prev, curr, RECEIPT)
+
+
+def test_decreasing_readings_are_rejected(batch):
+    with pytest.raises(ValueError, match="строки: 1"):
+        batch([[1, 1, 1], [5, 5, 5]], [[2, 2, 2], [4, 5, 5]], RECEIPT)
+
+
+def test_empty_batch(batch):
+    totals = batch([], [], HOT_WATER)[0]
+    assert len(totals) == 0
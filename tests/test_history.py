@@ -0,0 +1,156 @@
+import csv
+import multiprocessing
+
+import pytest
+
+import jkx_core
+import jkx_import
+from jkx_history import ConflictError, HistoryStore
+
+# Запись в историю под блокировкой (сравнить последние показания → дописать),
+# отклонение конфликтующих пачек импорта и переиндексация изменённого CSV.
+
+
+def _row(day, hot, cold=1.0, elec=10.0, total=1.0):
+    return [f"2025-01-{day:02d}T00:00:00", hot, cold, elec, 1.0, 0.0, 0.0, total]
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    monkeypatch.setattr(jkx_core, 'HISTORY_FILE', str(tmp_path / 'utility_history.csv'))
+    monkeypatch.setattr(jkx_core, 'HISTORY_DIR', str(tmp_path / 'history'))
+    monkeypatch.setattr(jkx_core, '_meter_stores', {})
+    return tmp_path
+
+
+# --- Compare-and-append ---
+def test_extend_with_stale_expect_last_writes_nothing(tmp_path):
+    store = HistoryStore(str(tmp_path / 'h.csv'))
+    store.extend([_row(1, 1.0)], expect_last=[0, 0, 0])
+    with pytest.raises(ConflictError) as info:
+        store.extend([_row(2, 2.0)], expect_last=[0, 0, 0])
+    assert info.value.last == [1.0, 1.0, 10.0]
+    assert len(store) == 1
+    assert len(HistoryStore(store.path)) == 1
+
+
+def _writer(path, n):
+    # каждый процесс дописывает по строке от последних показаний, пока не запишет n
+    store = HistoryStore(path)
+    written = 0
+    while written < n:
+        last = store.last_reading() or [0.0, 0.0, 0.0]
+        try:
+            store.append(_row(1, last[0] + 1, last[1], last[2]), expect_last=last)
+        except ConflictError:
+            continue
+        written += 1
+
+
+def test_concurrent_writers_keep_an_unbroken_chain(tmp_path):
+    path = str(tmp_path / 'h.csv')
+    procs = [multiprocessing.Process(target=_writer, args=(path, 50)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+    hot = HistoryStore(path).query()[1]
+    assert hot == [float(i) for i in range(1, 201)]
+
+
+# --- Import ---
+def test_import_rejects_batch_when_history_changed(history):
+    jkx_core.write_new_values([5.0, 1.0, 10.0], [5.0, 1.0, 10.0], 1.0, meter='a')
+    results = [
+        ('ok', 'a', _row(2, 6.0), 2, [0.0, 0.0, 0.0]),   # посчитано от устаревших показаний
+        ('ok', 'b', _row(2, 3.0), 3, [0.0, 0.0, 0.0]),
+    ]
+    errors = history / 'errors.csv'
+    stats = jkx_import.write_batches(iter(results), str(errors))
+    assert stats == {'accepted': 1, 'rejected': 1, 'meters': 1}
+    with open(errors, encoding='utf-8') as f:
+        report = list(csv.reader(f, delimiter=';'))
+    assert [r[:2] for r in report[1:]] == [['2', 'a']]
+    assert len(jkx_core.history_store('a')) == 1
+    assert len(jkx_core.history_store('b')) == 1
+
+
+# --- Tail and reindex ---
+def test_half_written_tail_is_not_read(tmp_path):
+    store = HistoryStore(str(tmp_path / 'h.csv'))
+    store.extend([_row(d, float(d)) for d in range(1, 4)])
+    with open(store.path, 'a', encoding='utf-8') as f:
+        f.write("2025-01-09T00:00:00;199.0")
+    cols = store.query()
+    assert [len(c) for c in cols] == [3] * 8
+    assert len(list(store.iter_range())) == 3
+    assert [r[1] for r in store.page(0, 10, sort='cost')] == [1.0, 2.0, 3.0]
+    with open(store.path, 'a', encoding='utf-8') as f:
+        f.write(";1;1;1;1;1;1\n")
+    assert len(store) == 4
+    assert store.last_reading() == [199.0, 1.0, 1.0]
+
+
+def test_csv_without_final_newline_keeps_its_last_row(tmp_path):
+    store = HistoryStore(str(tmp_path / 'h.csv'))
+    store.extend([_row(1, 1.0)])
+    with open(store.path, 'a', encoding='utf-8') as f:
+        f.write("2025-01-02T00:00:00;2.0;1.0;10.0;1.0;0.0;0.0;1.0")
+    assert len(HistoryStore(store.path)) == 2
+    assert store.last_reading() == [2.0, 1.0, 10.0]
+    store.append(_row(3, 3.0), expect_last=[2.0, 1.0, 10.0])
+    for s in (store, HistoryStore(store.path)):
+        assert s.query()[1] == [1.0, 2.0, 3.0]
+
+
+def test_append_after_interrupted_write_drops_the_fragment(tmp_path):
+    store = HistoryStore(str(tmp_path / 'h.csv'))
+    store.extend([_row(1, 1.0)])
+    with open(store.path, 'a', encoding='utf-8') as f:
+        f.write("2025-01-02T00:00:00;2;2")
+    assert len(store) == 1
+    store.append(_row(3, 3.0), expect_last=[1.0, 1.0, 10.0])
+    for s in (store, HistoryStore(store.path)):
+        assert s.query()[1] == [1.0, 3.0]
+        assert [len(c) for c in s.query()] == [2] * 8
+
+
+def test_row_inserted_mid_file_rebuilds_index(tmp_path):
+    store = HistoryStore(str(tmp_path / 'h.csv'))
+    store.extend([_row(d, float(d)) for d in range(1, 6)])
+    with open(store.path, encoding='utf-8') as f:
+        lines = f.readlines()
+    lines.insert(3, "2025-01-02T12:00:00;9999;1;10;1;0;0;1\n")
+    with open(store.path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    for s in (store, HistoryStore(store.path)):
+        assert len(s) == 6
+        assert [r[1] for r in s.page(0, 10)] == [1.0, 2.0, 9999.0, 3.0, 4.0, 5.0]
+
+
+def test_rewrite_with_same_row_count_restarts_stats(tmp_path):
+    from jkx_stats import HistoryStats
+    store = HistoryStore(str(tmp_path / 'h.csv'))
+    store.extend([_row(d, float(d), total=10.0) for d in range(1, 6)])
+    tracker = HistoryStats(store)
+    assert tracker.refresh().cost == 40.0
+    with open(store.path, encoding='utf-8') as f:
+        data = f.read()
+    with open(store.path, 'w', encoding='utf-8') as f:
+        f.write(data.replace(';10.0\n', ';20.0\n'))
+    stats = tracker.refresh()
+    assert (stats.rows, stats.cost) == (5, 80.0)
+
+
+# --- Dates ---
+@pytest.mark.parametrize('text', ['2025-06-29T21:12+03', '2025-06-29T21:12:56+03:00',
+                                  '2025-06-29T21:12:5Z', '2025-06-29 21:12:56', '20250629'])
+def test_dates_outside_history_formats_are_rejected(text):
+    from jkx_history import DateParser, _parse_date
+    with pytest.raises(ValueError, match="Unknown date format"):
+        _parse_date(text)
+    parse = DateParser()
+    parse('2025-06-29T21:12:56')
+    with pytest.raises(ValueError, match="Unknown date format"):
+        parse(text)
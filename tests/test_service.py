@@ -0,0 +1,136 @@
+import json
+import asyncio
+import threading
+
+import pytest
+
+import jkx_core
+import jkx_service
+from jkx_history import ConflictError
+
+# Сервис расчёта: проверка prev при сохранении, чужие записи в историю,
+# пачка, не совпавшая с файлом, пока следующая ещё в очереди, и ответ 409 по HTTP.
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    monkeypatch.setattr(jkx_core, 'HISTORY_FILE', str(tmp_path / 'utility_history.csv'))
+    monkeypatch.setattr(jkx_core, 'HISTORY_DIR', str(tmp_path / 'history'))
+    monkeypatch.setattr(jkx_core, '_meter_stores', {})
+    return tmp_path
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def _save(svc, curr, prev=None, meter='m'):
+    body = {'meter': meter, 'curr': curr, 'save': True}
+    if prev is not None:
+        body['prev'] = prev
+    return svc.calculate(body, {})
+
+
+def test_save_with_stale_prev_is_rejected(history):
+    async def scenario():
+        svc = jkx_service.BillingService(flush_interval=0.01)
+        try:
+            await _save(svc, [198, 305, 11077])
+            results = await asyncio.gather(
+                *(_save(svc, [199 + i, 305, 11077], prev=[198, 305, 11077]) for i in range(2)),
+                return_exceptions=True)
+            assert [isinstance(r, ConflictError) for r in results] == [False, True]
+            with pytest.raises(ConflictError):
+                await _save(svc, [9999, 9999, 99999], prev=[0, 0, 0])
+            # без save свой prev — просто расчёт
+            result = await svc.calculate({'meter': 'm', 'prev': [0, 0, 0], 'curr': [1, 1, 1]}, {})
+            assert result['usage'] == [1.0, 1.0, 1.0]
+            await svc.drain()
+        finally:
+            svc.close()
+
+    run(scenario())
+    assert jkx_core.history_store('m').query()[1] == [198.0, 199.0]
+
+
+def test_rows_written_by_other_programs_are_picked_up(history):
+    async def scenario():
+        svc = jkx_service.BillingService(flush_interval=0.01)
+        try:
+            await _save(svc, [198, 305, 11077])
+            jkx_core.write_new_values([250, 400, 12000], [52, 95, 923], 1.0, meter='m',
+                                      prev=[198, 305, 11077])
+            assert (await svc.last_reading({}, {'meter': 'm'}))['last'] == [250.0, 400.0, 12000.0]
+            result = await _save(svc, [251, 400, 12000])
+            assert result['prev'] == [250.0, 400.0, 12000.0]
+        finally:
+            svc.close()
+
+    run(scenario())
+
+
+def test_failed_batch_while_next_one_is_queued(history):
+    # каждая пачка пишется, только когда тест откроет свою «заслонку»
+    gates = [threading.Event() for _ in range(3)]
+    calls = iter(gates)
+    write = jkx_service.BillingService._write
+
+    def slow_write(pending, fsync):
+        next(calls).wait(10)
+        return write(pending, fsync)
+
+    async def scenario():
+        svc = jkx_service.BillingService(flush_interval=0.01)
+        svc._write = slow_write
+        try:
+            gates[0].set()
+            await _save(svc, [1, 1, 1])
+            first = asyncio.ensure_future(_save(svc, [2, 1, 1]))
+            await asyncio.sleep(0.05)          # пачка first уже пишется
+            jkx_core.write_new_values([5, 5, 5], [4, 4, 4], 1.0, meter='m', prev=[1, 1, 1])
+            second = asyncio.ensure_future(_save(svc, [3, 1, 1]))
+            await asyncio.sleep(0.05)          # second ждёт в очереди за first
+            gates[1].set()
+            with pytest.raises(ConflictError):
+                await first
+            assert (await svc.last_reading({}, {'meter': 'm'}))['last'] == [3.0, 1.0, 1.0]
+            gates[2].set()
+            with pytest.raises(ConflictError):
+                await second
+            assert (await svc.last_reading({}, {'meter': 'm'}))['last'] == [5.0, 5.0, 5.0]
+        finally:
+            svc.close()
+
+    run(scenario())
+
+
+async def _http(port, method, path, payload):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(payload).encode('utf-8')
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+                 "Connection: close\r\n\r\n".encode('latin-1') + body)
+    status = int((await reader.readline()).split()[1])
+    while (await reader.readline()) not in (b'\r\n', b''):
+        pass
+    data = json.loads(await reader.read())
+    writer.close()
+    return status, data
+
+
+def test_http_conflict_is_409(history):
+    async def scenario():
+        svc, server = await jkx_service.start(port=0, flush_interval=0.01)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            assert (await _http(port, 'POST', '/calculate', {'meter': 'm', 'curr': [1, 1, 1], 'save': True}))[0] == 200
+            status, data = await _http(port, 'POST', '/calculate',
+                                       {'meter': 'm', 'prev': [0, 0, 0], 'curr': [2, 2, 2], 'save': True})
+            assert status == 409
+            assert data['last'] == [1.0, 1.0, 1.0]
+            assert (await _http(port, 'POST', '/calculate', {'curr': 'x'}))[0] == 400
+        finally:
+            server.close()
+            await server.wait_closed()
+            svc.close()
+
+    run(scenario())
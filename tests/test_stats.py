@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from jkx_stats import MeterStats, format_stats
+
+# Сравнение месяцев: последний месяц с данными — с предыдущим календарным, а не с прошлым месяцем с данными.
+
+
+def _stats(*dates):
+    stats = MeterStats()
+    for i, d in enumerate(dates, 1):
+        stats.update((d, float(i), float(i), float(i), 1.0, 1.0, 1.0, 10.0 * i))
+    return stats
+
+
+def test_month_over_month_compares_adjacent_months():
+    key, prev_key, delta = _stats(datetime(2026, 1, 15), datetime(2026, 2, 15)).month_over_month()
+    assert (key, prev_key) == ((2026, 2), (2026, 1))
+    assert delta == [0.0, 0.0, 0.0, 10.0]
+
+
+def test_month_over_month_across_new_year():
+    key, prev_key, _ = _stats(datetime(2025, 12, 20), datetime(2026, 1, 5)).month_over_month()
+    assert (key, prev_key) == ((2026, 1), (2025, 12))
+
+
+def test_gap_before_last_month_is_reported_as_no_data():
+    stats = _stats(datetime(2025, 10, 1), datetime(2026, 10, 1))
+    assert stats.month_over_month() == ((2026, 10), (2026, 9), None)
+    assert stats.summary()['month_over_month']['delta'] is None
+    assert "10.2026 к 09.2026: за 09.2026 записей нет." in format_stats(stats)
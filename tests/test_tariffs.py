@@ -0,0 +1,127 @@
+import pickle
+import random
+from datetime import datetime
+
+import pytest
+
+from jkx_tariffs import TariffPlan, compile_plan, load_tariffs
+
+# Скомпилированные тарифы: совпадение TariffPlan.bill с исходной формулой до бита,
+# выбор версии плана по effective_from и ошибки проверки config — только ValueError.
+
+RECEIPT = {'hot_water_table_component': 41.34, 'thermal_conversion': 0.0665, 'thermal_tariff_gcal': 2556.3,
+           'cold_water': 42.3, 'sewage': 36.71, 'electricity': 6.57}
+HOT_WATER = {'hot_water': 211.44, 'cold_water': 42.3, 'sewage': 36.71, 'electricity': 6.57}
+
+
+def baseline_cost(prev, curr, COEFF):
+    # Формула calculate_utility_cost до компиляции тарифов — как была, с поиском ключей на каждый расчёт
+    if any(c < p for c, p in zip(curr, prev)):
+        raise ValueError("Показания не могут быть меньше предыдущих!")
+    hot = curr[0] - prev[0]
+    cold = curr[1] - prev[1]
+    elec = curr[2] - prev[2]
+    sewage = hot + cold
+    breakdown = {}
+    if all(k in COEFF for k in ('thermal_conversion', 'thermal_tariff_gcal', 'hot_water_table_component')):
+        table_comp = float(COEFF['hot_water_table_component'])
+        thermal_conv = float(COEFF['thermal_conversion'])
+        thermal_tariff = float(COEFF['thermal_tariff_gcal'])
+        hot_cost_water_component = hot * table_comp
+        hot_cost_thermal_component = hot * thermal_conv * thermal_tariff
+        hot_total_cost = hot_cost_water_component + hot_cost_thermal_component
+        breakdown.update({
+            'hot_water_component_unit': table_comp,
+            'thermal_component_unit': thermal_conv * thermal_tariff,
+            'thermal_conv': thermal_conv,
+            'thermal_tariff_gcal': thermal_tariff,
+            'hot_water_component_cost': hot_cost_water_component,
+            'thermal_component_cost': hot_cost_thermal_component,
+            'hot_total_cost': hot_total_cost,
+        })
+    else:
+        hot_total_cost = hot * float(COEFF.get('hot_water', 0.0))
+        breakdown['hot_total_cost'] = hot_total_cost
+    cold_cost = cold * COEFF.get('cold_water', 0.0)
+    sewage_cost = sewage * COEFF.get('sewage', 0.0)
+    elec_cost = elec * COEFF.get('electricity', 0.0)
+    total_cost = hot_total_cost + cold_cost + sewage_cost + elec_cost
+    breakdown.update({'cold_cost': cold_cost, 'sewage_cost': sewage_cost,
+                      'electricity_cost': elec_cost, 'total_cost': total_cost})
+    return total_cost, hot, cold, elec, breakdown
+
+
+# --- TariffPlan ---
+@pytest.mark.parametrize('coeff', [RECEIPT, HOT_WATER], ids=['receipt', 'hot_water'])
+def test_plan_bill_matches_baseline_bit_for_bit(coeff):
+    plan = compile_plan(coeff)
+    rnd = random.Random(3)
+    for _ in range(1000):
+        prev = [rnd.uniform(0, 500), rnd.uniform(0, 800), rnd.uniform(0, 20000)]
+        curr = [prev[0] + rnd.uniform(0, 10), prev[1] + rnd.uniform(0, 15), prev[2] + rnd.uniform(0, 400)]
+        assert plan.bill(prev, curr) == baseline_cost(prev, curr, coeff)
+
+
+def test_plan_rejects_decreasing_readings():
+    with pytest.raises(ValueError):
+        compile_plan(RECEIPT).bill([2, 2, 2], [1, 3, 3])
+
+
+def test_plan_is_immutable_and_picklable():
+    plan = compile_plan(RECEIPT, 'x', datetime(2025, 7, 1))
+    with pytest.raises(AttributeError):
+        plan.hot_rate = 0
+    copy = pickle.loads(pickle.dumps(plan))
+    assert isinstance(copy, TariffPlan)
+    assert (copy.name, copy.effective_from, copy.hot_rate) == ('x', datetime(2025, 7, 1), plan.hot_rate)
+
+
+# --- TariffBook ---
+def _book():
+    return load_tariffs({
+        'coefficients': HOT_WATER,
+        'tariff_plans': {
+            'default': [{'effective_from': '2025-07-01', 'coefficients': RECEIPT}],
+            'future': [{'effective_from': '2999-01-01', 'coefficients': HOT_WATER}],
+        },
+    })
+
+
+def test_version_is_chosen_by_effective_from():
+    book = _book()
+    assert not book.plan(at=datetime(2025, 6, 30, 23, 59)).receipt
+    assert book.plan(at=datetime(2025, 7, 1)).receipt
+    assert book.plan(at=datetime(2026, 1, 1)).effective_from == datetime(2025, 7, 1)
+    assert book.plan().receipt
+
+
+def test_plan_that_starts_in_the_future():
+    book = _book()
+    assert book.plan('future', at=datetime(3000, 1, 1)).effective_from == datetime(2999, 1, 1)
+    with pytest.raises(ValueError, match="не действовал"):
+        book.plan('future')
+    with pytest.raises(ValueError, match="не действовал на 2025-01-01"):
+        book.plan('future', at=datetime(2025, 1, 1))
+
+
+def test_unknown_plan():
+    with pytest.raises(ValueError, match="Нет тарифного плана"):
+        _book().plan('nope')
+
+
+@pytest.mark.parametrize('config', [
+    [],
+    {},
+    {'coefficients': []},
+    {'coefficients': {'cold_water': 1}},
+    {'coefficients': dict(HOT_WATER, cold_water='много')},
+    {'tariff_plans': []},
+    {'tariff_plans': {'x': 5}},
+    {'tariff_plans': {'x': [5]}},
+    {'tariff_plans': {'x': [{'effective_from': 20250701, 'coefficients': HOT_WATER}]}},
+    {'tariff_plans': {'x': [{'effective_from': '01/07/2025', 'coefficients': HOT_WATER}]}},
+], ids=['not-object', 'empty', 'coefficients-list', 'no-hot-water', 'rate-not-number',
+        'plans-list', 'plan-number', 'version-number', 'date-number', 'date-format'])
+def test_invalid_config_raises_value_error(config):
+    with pytest.raises(ValueError):
+        load_tariffs(config)